@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+residual vs. wall-clock time of the Kaczmarz row orderings
+on scaled-up versions of the test matrices.
+
+    python benchmarks/kaczmarz_order.py -N 1000
+"""
+
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+
+import airtools
+from airtools.kaczmarz import ORDERS
+
+from matrices import MATRICES
+
+
+def main():
+    p = argparse.ArgumentParser(description="Kaczmarz row ordering convergence benchmark")
+    p.add_argument("-N", type=int, default=1000, help="matrix size N x N")
+    p.add_argument("-m", "--matrix", choices=list(MATRICES), nargs="+", default=["fiedler", "gravity"])
+    p.add_argument("-s", "--sweeps", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    p.add_argument("--seed", type=int, default=0)
+    P = p.parse_args()
+
+    x = np.random.default_rng(P.seed).random(P.N)
+
+    # exclude the one-time JIT compile of the optional Numba kernel from the timings
+    airtools.kaczmarz(np.eye(2), np.ones(2), max_iter=2)
+
+    for name in P.matrix:
+        A = MATRICES[name](P.N)
+        b = A @ x
+        print(f"\n{name} {P.N} x {P.N}")
+        print(f"{'order':>12} {'sweeps':>6} {'time [s]':>9} {'||b - Ax|| / ||b||':>18}")
+        for order in ORDERS:
+            for sweeps in P.sweeps:
+                tic = time.perf_counter()
+                x_est = airtools.kaczmarz(A, b, max_iter=sweeps, order=order, seed=P.seed)[0]
+                toc = time.perf_counter() - tic
+                res = np.linalg.norm(b - A @ x_est) / np.linalg.norm(b)
+                print(f"{order:>12} {sweeps:6d} {toc:9.3f} {res:18.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+wall-clock time of the NumPy and compiled Fortran logmart on growing dense problems.
+Build the Fortran library first:
+
+    cmake -B build
+    cmake --build build
+    python benchmarks/logmart_backend.py
+"""
+
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+
+import airtools
+from airtools import _fortran
+
+
+def main():
+    p = argparse.ArgumentParser(description="logmart NumPy vs. Fortran backend benchmark")
+    p.add_argument("-N", type=int, nargs="+", default=[100, 200, 400, 800, 1600])
+    p.add_argument("--max_iter", type=int, default=50)
+    p.add_argument("--seed", type=int, default=0)
+    P = p.parse_args()
+
+    backends = ["numpy"] + (["fortran"] if _fortran.available() else [])
+    if len(backends) == 1:
+        print("Fortran library not built, timing NumPy backend only")
+
+    rng = np.random.default_rng(P.seed)
+
+    print(f"{'N':>6} " + " ".join(f"{b + ' [s]':>12}" for b in backends) + f" {'max |dx|':>10}")
+    for N in P.N:
+        A = airtools.Operator(rng.random((N, N)))
+        b = A @ (rng.random(N) + 0.5)
+        if "fortran" in backends:
+            A.fortran_array  # exclude the one-time reordering from the timing
+
+        times = []
+        x = []
+        for backend in backends:
+            tic = time.perf_counter()
+            x.append(airtools.logmart(A, b, max_iter=P.max_iter, backend=backend)[0])
+            times.append(time.perf_counter() - tic)
+
+        dx = abs(x[-1] - x[0]).max()
+        print(f"{N:6d} " + " ".join(f"{t:12.4f}" for t in times) + f" {dx:10.2e}")
+
+
+if __name__ == "__main__":
+    main()
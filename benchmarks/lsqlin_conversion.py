@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+throughput of the scipy.sparse <-> CVXOPT spmatrix conversions of airtools.lsqlin,
+against the conversion through Python lists of indices it replaces.
+
+    python benchmarks/lsqlin_conversion.py
+"""
+
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+from cvxopt import spmatrix
+from scipy import sparse
+
+from airtools import lsqlin
+
+
+def to_spmatrix_lists(A):
+    coo = A.tocoo()
+    return spmatrix(coo.data, coo.row.tolist(), coo.col.tolist(), A.shape)
+
+
+def to_scipy_lists(A):
+    return sparse.coo_matrix(
+        (np.array(A.V).squeeze(), (np.array(A.I).squeeze(), np.array(A.J).squeeze()))
+    )
+
+
+def best_time(f, A, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        f(A)
+        times.append(time.perf_counter() - tic)
+    return min(times)
+
+
+def main():
+    p = argparse.ArgumentParser(description="lsqlin sparse matrix conversion throughput")
+    p.add_argument("-nnz", type=int, nargs="+", default=[10**4, 10**5, 10**6, 10**7])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    P = p.parse_args()
+
+    rng = np.random.default_rng(P.seed)
+
+    print(f"{'nnz':>10} {'direction':>16} {'lists [M nnz/s]':>16} {'buffers [M nnz/s]':>18}")
+    for nnz in P.nnz:
+        N = max(int(np.sqrt(nnz)) * 10, 10)
+        A = sparse.csr_matrix(
+            (rng.random(nnz), (rng.integers(0, N, nnz), rng.integers(0, N, nnz))), shape=(N, N)
+        )
+        S = lsqlin.scipy_sparse_to_spmatrix(A)
+
+        for direction, old, new, arg in [
+            ("scipy -> cvxopt", to_spmatrix_lists, lsqlin.scipy_sparse_to_spmatrix, A),
+            ("cvxopt -> scipy", to_scipy_lists, lsqlin.spmatrix_sparse_to_scipy, S),
+        ]:
+            t_old = best_time(old, arg, P.repeat)
+            t_new = best_time(new, arg, P.repeat)
+            print(f"{A.nnz:10d} {direction:>16} {A.nnz / t_old / 1e6:16.1f} {A.nnz / t_new / 1e6:18.1f}")
+
+
+if __name__ == "__main__":
+    main()
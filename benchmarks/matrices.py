@@ -0,0 +1,32 @@
+"""
+the test matrices of src/airtools/tests/conftest.py, scaled up to N x N
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def identity(N: int) -> np.ndarray:
+    return 5.0 * np.eye(N)
+
+
+def fiedler(N: int) -> np.ndarray:
+    i = np.arange(N, dtype=np.float64)
+    return np.abs(i[:, None] - i[None, :])
+
+
+def gravity(N: int, d: float = 0.25) -> np.ndarray:
+    """
+    Hansen's regtools "gravity" kernel, d = 0.25 reproduces the 4 x 4 matrix of conftest.py
+    """
+    t = (np.arange(N) + 0.5) / N
+    return (d / N) / (d**2 + (t[:, None] - t[None, :]) ** 2) ** 1.5
+
+
+def hilbert(N: int) -> np.ndarray:
+    i = np.arange(N, dtype=np.float64)
+    return 1 / (i[:, None] + i[None, :] + 1)
+
+
+MATRICES = {"identity": identity, "fiedler": fiedler, "gravity": gravity, "hilbert": hilbert}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+time spent in the maxent positivity line search per CG iteration, on growing problems.
+Each call of the line search is one CG iteration of the columns of b still iterating,
+so the time is divided by that number of columns.
+Many right-hand sides (frames) take the batched path of the line search.
+
+    python benchmarks/maxent_linesearch.py
+    python benchmarks/maxent_linesearch.py -N 1000 -k 1 8 1000
+"""
+
+from __future__ import annotations
+import argparse
+import importlib
+import time
+
+import numpy as np
+from scipy.sparse import diags
+
+import airtools
+
+# cases with more unknowns x right-hand sides than this are skipped, they take minutes
+MAX_ELEMENTS = 10**6
+
+# the module, which airtools.maxent the function shadows
+maxent_module = importlib.import_module("airtools.maxent")
+
+
+def main():
+    p = argparse.ArgumentParser(description="maxent line search time per CG iteration")
+    p.add_argument("-N", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("-k", type=int, nargs="+", default=[1, 1000], help="numbers of right-hand sides")
+    p.add_argument("--lamb", type=float, default=0.1)
+    p.add_argument("--seed", type=int, default=0)
+    P = p.parse_args()
+
+    rng = np.random.default_rng(P.seed)
+    line_search = maxent_module._line_search
+    elapsed = []
+    columns = []
+
+    def timed(*args):
+        tic = time.perf_counter()
+        out = line_search(*args)
+        elapsed.append(time.perf_counter() - tic)
+        columns.append(args[0].shape[1])
+        return out
+
+    maxent_module._line_search = timed  # type: ignore[assignment]
+
+    print(f"{'N':>8} {'k':>6} {'CG iter':>8} {'line search [ms/iter]':>22} {'maxent [s]':>11}")
+    try:
+        for N in P.N:
+            # sparse banded A, so the products with A don't dominate the CG iteration
+            A = diags(rng.random((5, 1)) + 0.5, range(-2, 3), shape=(N, N), format="csr")
+            for k in P.k:
+                if N * k > MAX_ELEMENTS:
+                    print(f"skipping N={N} k={k}, N * k > {MAX_ELEMENTS}")
+                    continue
+                b = A @ (rng.random((N, k)) + 0.1)
+
+                elapsed.clear()
+                columns.clear()
+                tic = time.perf_counter()
+                airtools.maxent(A, b, P.lamb)
+                total = time.perf_counter() - tic
+
+                per_iter = 1000 * sum(elapsed) / sum(columns)
+                print(f"{N:8d} {k:6d} {sum(columns):8d} {per_iter:22.3f} {total:11.3f}")
+    finally:
+        maxent_module._line_search = line_search
+
+
+if __name__ == "__main__":
+    main()
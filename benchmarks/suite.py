@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+benchmark suite of the airtools solvers on dense and sparse problems of growing size.
+For each solver, problem and number of unknowns N it records the wall-clock time
+(best of --repeat runs), the peak memory allocated during one run (tracemalloc),
+the iterations reported by the solver and the relative residual ||A x - b|| / ||b||.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py -N 1000 10000 100000 1000000 --problem sparse tomo
+
+Results are compared to the stored baseline, and the exit code is 1 if any case
+regressed beyond the tolerances. Times are machine dependent: refresh the baseline
+on the machine that runs the comparison.
+
+    python benchmarks/suite.py --save benchmarks/baseline.json
+    python benchmarks/suite.py --compare benchmarks/baseline.json
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+import airtools
+from airtools import lsqlin, problems
+
+from matrices import gravity
+
+# dense N x N problems beyond this would need more than 128 MB for A alone
+DENSE_MAX = 4000
+# fraction of all-zero rows of the sparse problems, for rzr
+ZERO_ROWS = 0.01
+
+
+def dense_problem(N: int, rng: np.random.Generator):
+    return gravity(N)
+
+
+def sparse_problem(N: int, rng: np.random.Generator, nnz_per_row: int = 16):
+    """
+    N x N nonnegative matrix with nnz_per_row random columns per row,
+    a few all-zero rows, like the rays of a tomography problem missing the grid
+    """
+    rows = np.repeat(np.arange(N), nnz_per_row)
+    cols = rng.integers(0, N, rows.size)
+    A = sparse.csr_matrix((rng.random(rows.size) + 0.1, (rows, cols)), shape=(N, N))
+    zero = rng.choice(N, int(ZERO_ROWS * N), replace=False)
+    A = sparse.diags(np.isin(np.arange(N), zero, invert=True).astype(float)) @ A
+    A.eliminate_zeros()
+    return A.tocsr()
+
+
+def tomo_problem(N: int, rng: np.random.Generator):
+    """
+    parallel-beam tomography of an n x n image, n = round(sqrt(N)), 90 angles
+    """
+    return problems.paralleltomo(int(round(np.sqrt(N))), theta=np.arange(0, 180, 2))
+
+
+PROBLEMS = {"dense": dense_problem, "sparse": sparse_problem, "tomo": tomo_problem}
+
+
+def run_kaczmarz(A, b):
+    # sweeps until the discrepancy principle stops it, counted by the callback
+    infos = []
+    x = airtools.kaczmarz(
+        A, b, max_iter=50, stop_mdp=True, taudelta=1e-2 * np.linalg.norm(b), callback=infos.append
+    )[0]
+    return x, len(infos)
+
+
+def run_logmart(A, b):
+    x, _, iterations = airtools.logmart(A, b, max_iter=50)
+    return x, iterations
+
+
+def run_maxent(A, b):
+    x, _, _, info = airtools.maxent(A, b, 1e-2, full_output=True)
+    return x, int(info["iterations"][0])
+
+
+def run_picard(A, b):
+    U, s, _ = airtools.csvd(A, 20, method="randomized", seed=0)
+    airtools.picard(U, s, b)
+    return None, None
+
+
+def run_rzr(A, b):
+    airtools.rzr(A, b)
+    return None, None
+
+
+def run_lsqlin(A, b):
+    res = lsqlin.lsqlin(A, b, lb=0, ub=10)
+    return res["x"], res["iterations"]
+
+
+def run_lsqnonneg(A, b):
+    res = lsqlin.lsqnonneg(A, b)
+    return res["x"], res["iterations"]
+
+
+SOLVERS = {
+    "kaczmarz": run_kaczmarz,
+    "logmart": run_logmart,
+    "maxent": run_maxent,
+    "picard": run_picard,
+    "rzr": run_rzr,
+    "lsqlin": run_lsqlin,
+    "lsqnonneg": run_lsqnonneg,
+}
+
+
+def measure(run, A, b, repeat: int) -> dict:
+    # separate run, as tracemalloc slows down the allocations it traces.
+    # It also warms up the JIT-compiled kernels and operator caches excluded from the timing.
+    tracemalloc.start()
+    try:
+        run(A, b)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        x, iterations = run(A, b)
+        times.append(time.perf_counter() - tic)
+
+    residual = None if x is None else float(np.linalg.norm(A @ x - b) / np.linalg.norm(b))
+
+    return {
+        "time": min(times),
+        "peak_mb": peak / 2**20,
+        "iterations": None if iterations is None else int(iterations),
+        "residual": residual,
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], time_tol: float, memory_tol: float) -> list[str]:
+    """
+    regressions of results against baseline: time or peak memory larger than the factor
+    time_tol or memory_tol (beyond timer and allocator noise of 10 ms and 0.1 MB),
+    or more iterations. Cases missing from the baseline are skipped.
+    """
+    base = {(r["solver"], r["problem"], r["N"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        key = (r["solver"], r["problem"], r["N"])
+        if key not in base:
+            continue
+        old = base[key]
+        name = f"{r['solver']} {r['problem']} N={r['N']}"
+        if r["time"] > time_tol * old["time"] + 0.01:
+            regressions.append(f"{name}: time {old['time']:.4f} -> {r['time']:.4f} s")
+        if r["peak_mb"] > memory_tol * old["peak_mb"] + 0.1:
+            regressions.append(f"{name}: peak memory {old['peak_mb']:.1f} -> {r['peak_mb']:.1f} MB")
+        if old["iterations"] is not None and r["iterations"] is not None:
+            if r["iterations"] > old["iterations"]:
+                regressions.append(f"{name}: iterations {old['iterations']} -> {r['iterations']}")
+
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description="airtools solver benchmark suite")
+    p.add_argument("-N", type=int, nargs="+", default=[1000, 10000], help="numbers of unknowns")
+    p.add_argument("--solver", nargs="+", choices=list(SOLVERS), default=list(SOLVERS))
+    p.add_argument("--problem", nargs="+", choices=list(PROBLEMS), default=["dense", "sparse"])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--save", help="write the results to this JSON file")
+    p.add_argument("--compare", help="baseline JSON file to compare with")
+    p.add_argument("--time_tol", type=float, default=1.5, help="allowed factor of time increase")
+    p.add_argument("--memory_tol", type=float, default=1.2, help="allowed factor of memory increase")
+    P = p.parse_args()
+
+    results = []
+    print(f"{'solver':>10} {'problem':>8} {'N':>8} {'time [s]':>10} {'peak [MB]':>10} {'iter':>6} {'residual':>10}")
+    for problem in P.problem:
+        for N in P.N:
+            if problem == "dense" and N > DENSE_MAX:
+                print(f"skipping dense N={N} > {DENSE_MAX}")
+                continue
+            rng = np.random.default_rng(P.seed)
+            A = PROBLEMS[problem](N, rng)
+            b = A @ (1.5 + np.sin(np.linspace(0, 4 * np.pi, A.shape[1])))
+            # the solvers get the problem cleaned up by rzr, as in practice
+            Ag, bg, _ = airtools.rzr(A, b)
+
+            for solver in P.solver:
+                r = {"solver": solver, "problem": problem, "N": A.shape[1]}
+                r.update(measure(SOLVERS[solver], *((A, b) if solver == "rzr" else (Ag, bg)), P.repeat))
+                results.append(r)
+
+                it = "" if r["iterations"] is None else r["iterations"]
+                res = "" if r["residual"] is None else f"{r['residual']:.2e}"
+                print(
+                    f"{solver:>10} {problem:>8} {r['N']:8d} {r['time']:10.4f} {r['peak_mb']:10.1f} {it:>6} {res:>10}"
+                )
+
+    if P.save:
+        Path(P.save).write_text(json.dumps(results, indent=1) + "\n")
+
+    if P.compare:
+        regressions = compare(
+            results, json.loads(Path(P.compare).read_text()), P.time_tol, P.memory_tol
+        )
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {P.compare}")
+
+
+if __name__ == "__main__":
+    main()
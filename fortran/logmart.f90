@@ -6,7 +6,7 @@ implicit none
 
 contains
 
-pure subroutine logmart(A,b,relax,x0,sigma,max_iter, x)
+pure subroutine logmart(A,b,relax,x0,sigma,max_iter, x, chi2_out, iter_out)
 ! delta Chisquare.
 ! stopped if Chisquare increases.
 !
@@ -22,6 +22,8 @@ pure subroutine logmart(A,b,relax,x0,sigma,max_iter, x)
 ! Outputs
 ! -------
 ! x: N vector
+! chi2_out: Chisquare of the last iteration
+! iter_out: last iteration
 !
 !
 !    AUTHOR:	Joshua Semeter
@@ -38,8 +40,11 @@ real(wp), optional, value :: relax, sigma
 real(wp), intent(in),optional :: x0(:)
 integer, optional, value :: max_iter
 real(wp), intent(out) :: x(:)
+real(wp), intent(out), optional :: chi2_out
+integer, intent(out), optional :: iter_out
 
-real(wp), dimension(size(b)) :: W(size(b)), x_prev,c, op_b
+real(wp), dimension(size(b)) :: W(size(b)), c, op_b, xA
+real(wp) :: x_prev(size(x))
 integer :: i
 real(wp) :: t,chi2,chiold
 
@@ -72,21 +77,27 @@ W = 1
 W = W / sum(W)
 
 ! --- iterate solution
-chi2 = chi_squared(A, op_b, x, sigma)
+! A*x is kept from the Chisquare of the previous iteration: one forward and one back projection
+xA = matmul(A, x)
+chi2 = sqrt(sum(((xA - op_b) / sigma)**2))
 
 do i = 1, max_iter
   x_prev = x
-  t = minval(1/matmul(A,x))
-  C = relax*t*(1-(matmul(A,x)/op_b))
-  x = x / (1-x*matmul(transpose(A),W*C))
+  t = minval(1/xA)
+  C = relax*t*(1-(xA/op_b))
+  x = x / (1-x*matmul(W*C, A))
 ! monitor solution
+  xA = matmul(A, x)
   chiold = chi2
-  chi2 = chi_squared(A, op_b, x, sigma)
-  if (chi2 > chiold .and. i > 2) exit
+  chi2 = sqrt(sum(((xA - op_b) / sigma)**2))
+  if (chi2 >= chiold .and. i > 2) exit
 enddo
 
 x = x_prev
 
+if (present(chi2_out)) chi2_out = chi2
+if (present(iter_out)) iter_out = min(i, max_iter)
+
 end subroutine logmart
 
 
@@ -0,0 +1,27 @@
+module art_c
+! C-ABI wrapper of art::logmart, loaded by airtools/_fortran.py with ctypes.
+! A is column-major (Fortran order).
+
+use, intrinsic :: iso_c_binding, only: c_int, c_double
+use art, only: logmart
+
+implicit none
+
+contains
+
+subroutine logmart_c(m, n, A, b, relax, x0, sigma, max_iter, x, chi2, iter) bind(C, name="airtools_logmart")
+
+integer(c_int), intent(in), value :: m, n, max_iter
+real(c_double), intent(in) :: A(m,n), b(m), x0(n)
+real(c_double), intent(in), value :: relax, sigma
+real(c_double), intent(out) :: x(n), chi2
+integer(c_int), intent(out) :: iter
+
+integer :: it
+
+call logmart(A, b, relax, x0, sigma, int(max_iter), x, chi2, it)
+iter = int(it, c_int)
+
+end subroutine logmart_c
+
+end module art_c
@@ -1,9 +1,12 @@
 from .kaczmarz import kaczmarz
 from .maxent import maxent
 from .picard import picard
+from .csvd import csvd
 from .logmart import logmart
-from .rzr import rzr
+from .rzr import rzr, expand
+from .linop import Operator
+from .rowblock import RowBlockMatrix
 
-__all__ = ["kaczmarz", "maxent", "picard", "logmart", "rzr"]
+__all__ = ["kaczmarz", "maxent", "picard", "csvd", "logmart", "rzr", "expand", "Operator", "RowBlockMatrix"]
 
 __version__ = "1.3.0"
@@ -0,0 +1,98 @@
+"""
+optional compiled log-MART from fortran/logmart.f90, called through its C ABI wrapper.
+
+Build the shared library with CMake, which places it next to this file:
+
+    cmake -B build
+    cmake --build build
+
+or point environment variable AIRTOOLS_LOGMART_LIB at the library file.
+"""
+
+from __future__ import annotations
+import ctypes
+import os
+from pathlib import Path
+
+import numpy as np
+
+NAMES = (
+    "libairtools_logmart.so",
+    "libairtools_logmart.dylib",
+    "libairtools_logmart.dll",
+    "airtools_logmart.dll",
+)
+
+
+def _load() -> ctypes.CDLL | None:
+    env = os.environ.get("AIRTOOLS_LOGMART_LIB")
+    candidates = [Path(env)] if env else [Path(__file__).parent / name for name in NAMES]
+
+    for path in candidates:
+        if not path.is_file():
+            continue
+        try:
+            lib = ctypes.CDLL(str(path))
+        except OSError:
+            continue
+
+        dbl = ctypes.c_double
+        dptr = np.ctypeslib.ndpointer(dtype=np.float64, flags="F_CONTIGUOUS")
+        vec = np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags="C_CONTIGUOUS")
+        lib.airtools_logmart.restype = None
+        lib.airtools_logmart.argtypes = [
+            ctypes.c_int,
+            ctypes.c_int,
+            dptr,
+            vec,
+            dbl,
+            vec,
+            dbl,
+            ctypes.c_int,
+            vec,
+            ctypes.POINTER(dbl),
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        return lib
+
+    return None
+
+
+_lib = _load()
+
+
+def available() -> bool:
+    return _lib is not None
+
+
+def logmart(
+    A: np.ndarray, b: np.ndarray, relax: float, x0: np.ndarray, sigma: float, max_iter: int
+) -> tuple[np.ndarray, float, int]:
+    """
+    A: M x N Fortran-ordered float64, b: M float64, x0: N float64 initial guess
+
+    Returns x, chi2, last iteration (0-based like the NumPy implementation)
+    """
+    if _lib is None:
+        raise ImportError("Fortran logmart library not found, see airtools/_fortran.py")
+
+    m, n = A.shape
+    x = np.empty(n)
+    chi2 = ctypes.c_double()
+    it = ctypes.c_int()
+
+    _lib.airtools_logmart(
+        m,
+        n,
+        A,
+        np.ascontiguousarray(b, dtype=np.float64),
+        relax,
+        np.ascontiguousarray(x0, dtype=np.float64),
+        sigma,
+        max_iter,
+        x,
+        ctypes.byref(chi2),
+        ctypes.byref(it),
+    )
+
+    return x, chi2.value, it.value - 1
@@ -0,0 +1,175 @@
+"""
+inner loops of the row-action solvers, operating directly on the
+indptr / indices / data arrays of a CSR matrix, or on the rows of a dense matrix.
+
+The loops touch only the nonzeros of each row, so a sweep is O(nnz).
+If Numba is installed the explicit-loop kernels are compiled, otherwise
+an equivalent NumPy implementation with one vectorized update per row is used.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None  # type: ignore[assignment]
+
+
+def _kaczmarz_sweep_loop(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    data: np.ndarray,
+    b: np.ndarray,
+    x: np.ndarray,
+    rows: np.ndarray,
+    RowNormSq: np.ndarray,
+    lamb: float,
+    nonneg: bool,
+    res2: np.ndarray,
+) -> None:
+    """
+    one Kaczmarz sweep over "rows", updating x in place.
+    b is m x k and x is n x k: the k right-hand sides are swept together.
+    Only the entries of x touched by a row are clamped when nonneg is set.
+
+    x may also be n x 2k with a fixed x_start in its last k columns, e.g. the iterate
+    the sweep started from. Then the squared residual (b_i - a_i x_start)^2 of each row
+    is added to res2, in the same pass over the row as its update.
+    """
+    k = b.shape[1]
+    dot = np.empty(x.shape[1])
+
+    for i in rows:
+        start = indptr[i]
+        stop = indptr[i + 1]
+
+        dot[:] = 0.0
+        for p in range(start, stop):
+            j = indices[p]
+            for c in range(x.shape[1]):
+                dot[c] += data[p] * x[j, c]
+
+        for c in range(k, x.shape[1]):
+            r = b[i, c - k] - dot[c]
+            res2[c - k] += r * r
+
+        for c in range(k):
+            dot[c] = lamb * (b[i, c] - dot[c]) / RowNormSq[i]
+
+        for p in range(start, stop):
+            j = indices[p]
+            for c in range(k):
+                x[j, c] += dot[c] * data[p]
+                if nonneg and x[j, c] < 0:
+                    x[j, c] = 0.0
+
+
+def _kaczmarz_sweep_numpy(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    data: np.ndarray,
+    b: np.ndarray,
+    x: np.ndarray,
+    rows: np.ndarray,
+    RowNormSq: np.ndarray,
+    lamb: float,
+    nonneg: bool,
+    res2: np.ndarray,
+) -> None:
+    """
+    pure NumPy fallback of _kaczmarz_sweep_loop. Requires canonical CSR (no duplicate indices).
+    """
+    k = b.shape[1]
+    for i in rows:
+        cols = indices[indptr[i] : indptr[i + 1]]
+        a = data[indptr[i] : indptr[i + 1]]
+
+        xc = x[cols, :]
+        dot = a @ xc
+        if x.shape[1] > k:
+            res2 += (b[i, :] - dot[k:]) ** 2
+
+        xc = xc[:, :k]
+        xc += a[:, None] * (lamb * (b[i, :] - dot[:k]) / RowNormSq[i])
+        if nonneg:
+            xc[xc < 0] = 0
+        x[cols, :k] = xc
+
+
+def _kaczmarz_sweep_dense_loop(
+    A: np.ndarray,
+    b: np.ndarray,
+    x: np.ndarray,
+    rows: np.ndarray,
+    RowNormSq: np.ndarray,
+    lamb: float,
+    nonneg: bool,
+    res2: np.ndarray,
+) -> None:
+    """
+    _kaczmarz_sweep_loop on the rows of dense A, without a CSR copy of A.
+    The zero elements of a row are skipped, as they are absent from CSR.
+    """
+    k = b.shape[1]
+    dot = np.empty(x.shape[1])
+
+    for i in rows:
+        dot[:] = 0.0
+        for j in range(A.shape[1]):
+            if A[i, j] != 0:
+                for c in range(x.shape[1]):
+                    dot[c] += A[i, j] * x[j, c]
+
+        for c in range(k, x.shape[1]):
+            r = b[i, c - k] - dot[c]
+            res2[c - k] += r * r
+
+        for c in range(k):
+            dot[c] = lamb * (b[i, c] - dot[c]) / RowNormSq[i]
+
+        for j in range(A.shape[1]):
+            if A[i, j] != 0:
+                for c in range(k):
+                    x[j, c] += dot[c] * A[i, j]
+                    if nonneg and x[j, c] < 0:
+                        x[j, c] = 0.0
+
+
+def _kaczmarz_sweep_dense_numpy(
+    A: np.ndarray,
+    b: np.ndarray,
+    x: np.ndarray,
+    rows: np.ndarray,
+    RowNormSq: np.ndarray,
+    lamb: float,
+    nonneg: bool,
+    res2: np.ndarray,
+) -> None:
+    """
+    pure NumPy fallback of _kaczmarz_sweep_dense_loop
+    """
+    k = b.shape[1]
+    for i in rows:
+        cols = np.flatnonzero(A[i])
+        a = A[i, cols]
+
+        xc = x[cols, :]
+        dot = a @ xc
+        if x.shape[1] > k:
+            res2 += (b[i, :] - dot[k:]) ** 2
+
+        xc = xc[:, :k]
+        xc += a[:, None] * (lamb * (b[i, :] - dot[:k]) / RowNormSq[i])
+        if nonneg:
+            xc[xc < 0] = 0
+        x[cols, :k] = xc
+
+
+if numba is not None:
+    kaczmarz_sweep = numba.njit(cache=True)(_kaczmarz_sweep_loop)
+    kaczmarz_sweep_dense = numba.njit(cache=True)(_kaczmarz_sweep_dense_loop)
+else:
+    kaczmarz_sweep = _kaczmarz_sweep_numpy
+    kaczmarz_sweep_dense = _kaczmarz_sweep_dense_numpy
@@ -0,0 +1,73 @@
+"""
+progress reports of the iterative solvers to a user callback.
+
+After every iteration, the solvers given callback=f call f(info) with info a dict:
+
+    "iteration": int, counting from 0
+    "residual": || b - A x ||, float, or one value per column of b
+    "objective": value of the function the solver minimizes, float or per column of b
+    "time": dict of the seconds spent in this iteration on
+        "projection" (products with A), "backprojection" (products with A.T)
+        and "update" (everything else)
+
+plus solver-specific entries. A Monitor is only created for a callback,
+so a solver without one neither times its phases nor computes extra quantities.
+"""
+
+from __future__ import annotations
+from time import perf_counter
+
+import numpy as np
+
+PHASES = ("projection", "backprojection", "update")
+
+
+class Monitor:
+    def __init__(self, callback, vector: bool, **fixed):
+        """
+        vector: bool
+            report the residual and objective of the single column of b as floats
+        fixed:
+            entries added to every info dict, e.g. the regularization parameter
+        """
+        if not callable(callback):
+            raise TypeError("callback must be callable")
+
+        self.callback = callback
+        self.vector = vector
+        self.fixed = fixed
+        self.start()
+
+    def start(self) -> None:
+        """
+        start timing a new iteration
+        """
+        self.time = dict.fromkeys(PHASES, 0.0)
+        self.tic = perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """
+        add the time since the previous lap to phase
+        """
+        toc = perf_counter()
+        self.time[phase] += toc - self.tic
+        self.tic = toc
+
+    def report(self, iteration: int, residual, objective) -> None:
+        """
+        pass the iteration to the callback, the time spent in the callback is not counted
+        """
+        self.lap("update")
+
+        residual = np.asarray(residual, dtype=float)
+        objective = np.asarray(objective, dtype=float)
+        info = {
+            "iteration": iteration,
+            "residual": float(residual[0]) if self.vector else residual.copy(),
+            "objective": float(objective[0]) if self.vector else objective.copy(),
+            "time": self.time,
+            **self.fixed,
+        }
+        self.callback(info)
+
+        self.start()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import numpy as np
+from scipy.sparse.linalg import LinearOperator, svds
+
+from .linop import as_operator
+
+METHODS = ("auto", "full", "svds", "randomized")
+
+
+def csvd(
+    A,
+    k: int | None = None,
+    *,
+    method: str = "auto",
+    oversample: int = 10,
+    n_iter: int = 2,
+    seed=None,
+) -> tuple:
+    """
+    CSVD Compact singular value decomposition.
+
+     U,s,V = csvd(A)
+     U,s,V = csvd(A, k)
+
+     Computes the compact form of the SVD of A:
+        A = U @ diag(s) @ V.T,
+     where
+        U  is  m-by-p
+        s  is  p
+        V  is  n-by-p
+     with p = min(m,n), or the k largest singular triplets if k is given.
+     s is in decreasing order, so U, s can be passed directly to picard().
+
+    Parameters
+    ----------
+    A: numpy.ndarray, scipy.sparse matrix, LinearOperator or airtools.Operator
+        M x N matrix
+    k: int
+        number of largest singular values to compute. None computes all of them.
+    method: str
+        * "full": dense LAPACK SVD, only when A fits in memory as a dense array
+        * "svds": truncated SVD by ARPACK through products with A and A.T
+        * "randomized": Halko-Martinsson-Tropp randomized range finder, through products
+          with blocks of k + oversample vectors. Fastest for large A with decaying spectrum.
+        * "auto": "full" if k is None, else "randomized"
+    oversample: int
+        extra random vectors of the randomized method
+    n_iter: int
+        power iterations of the randomized method, improves accuracy for slowly decaying spectra
+    seed: int or numpy.random.Generator
+        seed of the randomized method
+
+    Per Christian Hansen, IMM, 06/22/93.
+    ported to Python by Michael Hirsch
+
+    Reference: N. Halko, P. G. Martinsson and J. A. Tropp, "Finding structure with randomness:
+    Probabilistic algorithms for constructing approximate matrix decompositions",
+    SIAM Review 53, 2011.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+
+    A = as_operator(A)
+    p = min(A.shape)
+    if k is not None and not 1 <= k <= p:
+        raise ValueError(f"k must be between 1 and {p}")
+
+    if method == "auto":
+        method = "full" if k is None else "randomized"
+
+    if method == "full":
+        if A.streaming or A.matrix_free:
+            raise ValueError("out-of-core or matrix-free A needs method 'svds' or 'randomized'")
+        U, s, Vt = np.linalg.svd(A.A.toarray() if A.issparse else A.A, full_matrices=False)
+        if k is not None:
+            U, s, Vt = U[:, :k], s[:k], Vt[:k]
+        return U, s, Vt.T
+
+    if k is None:
+        raise ValueError(f"method {method} needs the number of singular values k")
+
+    if method == "svds":
+        if k == p:
+            raise ValueError("svds computes at most min(M, N) - 1 singular values, use method 'full'")
+        L = LinearOperator(
+            A.shape,
+            matvec=A.dot,
+            rmatvec=A.rmatvec,
+            matmat=A.dot,
+            rmatmat=A.rmatvec,
+            dtype=np.float64,
+        )
+        U, s, Vt = svds(L, k=k, random_state=seed)
+        i = np.argsort(s)[::-1]
+        return U[:, i], s[i], Vt[i].T
+
+    return _randomized_svd(A, k, oversample, n_iter, np.random.default_rng(seed))
+
+
+def _randomized_svd(A, k: int, oversample: int, n_iter: int, rng: np.random.Generator) -> tuple:
+    """
+    Halko et al. Algorithm 4.4 (randomized subspace iteration) followed by Algorithm 5.1
+    """
+    m, n = A.shape
+    ell = min(k + oversample, m, n)
+
+    Q, _ = np.linalg.qr(A.dot(rng.standard_normal((n, ell))))
+    for _ in range(n_iter):
+        # re-orthonormalize between products to keep the small singular directions
+        Q, _ = np.linalg.qr(A.rmatvec(Q))
+        Q, _ = np.linalg.qr(A.dot(Q))
+
+    # B = Q.T @ A, an ell x n matrix
+    B = A.rmatvec(Q).T
+    Ub, s, Vt = np.linalg.svd(B, full_matrices=False)
+
+    return (Q @ Ub)[:, :k], s[:k], Vt[:k].T
@@ -1,9 +1,16 @@
 from __future__ import annotations
 import logging
+from functools import lru_cache
 
 import numpy as np
 from numpy.linalg import norm
-import scipy.sparse as sp
+from scipy import sparse
+
+from ._kernels import kaczmarz_sweep, kaczmarz_sweep_dense
+from ._monitor import Monitor
+from .linop import _nnz, as_operator
+
+ORDERS = ("cyclic", "shuffle", "random", "multilevel")
 
 
 def kaczmarz(
@@ -16,6 +23,10 @@ def kaczmarz(
     stop_mdp: bool = False,
     taudelta: float = 0,
     nonneg: bool = True,
+    block_size: int = 1,
+    order: str = "cyclic",
+    seed=None,
+    callback=None,
 ) -> tuple:
     """
     Michael Hirsch May 2014
@@ -24,14 +35,16 @@ def kaczmarz(
 
     Parameters
     ----------
-     A: numpy.ndarray
-         M x N 2-D projection matrix
+     A: numpy.ndarray, scipy.sparse matrix, airtools.Operator or airtools.RowBlockMatrix
+         M x N 2-D projection matrix. Out-of-core RowBlockMatrix is swept one block of rows
+         at a time, and "order" applies within each block.
      b: numpy.ndarray
-         N x 1 1-D vector of observations
+         M x 1 1-D vector of observations, or M x K matrix of K observation vectors
+         that are all solved in the same sweeps
      max_iter:  int
          maximum number of ART iterations
      x0: numpy.ndarray
-         N x 1 1-D vector of initialization (a guess at x)
+         N x 1 1-D vector of initialization (a guess at x), or N x K for K right-hand sides
      lamb: float
          relaxation parameter (see Herman Ch.11.2)
      stop_mdp: bool
@@ -40,11 +53,38 @@ def kaczmarz(
         stopping condition
      nonneg: bool
          enforces non-negativity of solution
+     block_size: int
+         number of rows updated together. 1 is the classical row-action Kaczmarz.
+         Larger values process each block of rows as one sparse mat-vec with
+         component averaging inside the block (BICAV), sequentially across blocks.
+         Rows of a block that share no column take full steps, so blocks of e.g. the
+         parallel rays of one angle progress per sweep about as much as single rows.
+         Each block costs a few sparse products in Python, so use blocks of many rows.
+     order: str
+         order in which rows (or blocks) are visited each sweep:
+
+         * "cyclic": natural order
+         * "shuffle": a new random permutation every sweep
+         * "random": Strohmer-Vershynin sampling with probability proportional to ||a_i||^2
+         * "multilevel": fixed bit-reversal order, so consecutive updates are maximally
+           far apart, e.g. in projection angle for angle-sorted rows
+     seed: int or numpy.random.Generator
+         seed of the random row orderings, for reproducible runs
+     callback: callable
+         called after every sweep as callback(info), with info a dict of "iteration",
+         "residual" ||b - A x||, "objective" ||b - A x||^2 and "time" per phase.
+         The sweeps are timed as "update", the residual as "projection".
+
+    With stop_mdp or callback and out-of-core A (airtools.RowBlockMatrix), each sweep computes
+    the residual of the iterate it starts from in the same pass over the blocks of rows as its
+    updates, instead of reading A again for a forward projection after every sweep.
+    So iteration i is checked and reported during sweep i + 1, and stop_mdp returns
+    the iterate that satisfies the discrepancy principle. Not for order "random".
 
     Results
     -------
     x: np.ndarray
-        the estimated solution of A @ x = b
+        the estimated solution of A @ x = b, N x K if b is M x K
     residual: np.ndarray
         the error b-A@x
 
@@ -52,59 +92,237 @@ def kaczmarz(
     ----------
     Herman, G. " Fundamentals of Computerized Tomography", 2nd Ed., Springer, 2009
     Natterer, F. "The mathematics of computed tomography", SIAM, 2001
+    Strohmer, T. and Vershynin, R. "A randomized Kaczmarz algorithm with exponential convergence",
+    J. Fourier Anal. Appl. 15, 2009
+    Herman, G. and Meyer, L. "Algebraic reconstruction techniques can be made computationally
+    efficient", IEEE Trans. Med. Imaging 12, 1993
+    Censor, Y., Gordon, D. and Gordon, R. "BICAV: a block-iterative parallel algorithm for
+    sparse systems with pixel-related weighting", IEEE Trans. Med. Imaging 20, 2001
     """
     if lamb < 0 or lamb > 2:
         raise ValueError("unstable relaxation parameter")
     if max_iter < 2:
         raise ValueError("unusable maximum number of iterations")
+    if block_size < 1:
+        raise ValueError("block_size must be a positive integer")
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {ORDERS}")
     # %% user parameters
     residual = None  # init
 
+    A = as_operator(A)
     n = A.shape[1]  # only need rows
 
+    b = np.asarray(b, dtype=float)
+    if b.ndim not in (1, 2):
+        raise ValueError("b must be a vector or a matrix with one observation vector per column")
+    vector = b.ndim == 1
+    # the sweeps always work on M x K right-hand sides, K=1 for vector b
+    b = b.reshape(b.shape[0], -1)
+
     if x0 is None:  # we'll use zeros
         x0 = np.zeros(n, order="F")  # 1-D vector
 
     if stop_mdp and taudelta == 0:
         logging.warning("tauDelta = 0 effectively disables Morozov discrepancy principle")
-    # %% disregard all-zero columns of A
-    if sp.issparse(A):
-        assert isinstance(A, sp.spmatrix)
-        A = A.tocsr()  # save time if it was csc sparse
-        # speedup: compute norms along columns at once, and retrieve
-        RowNormSq = np.asarray(
-            A.multiply(A).sum(axis=1)
-        ).squeeze()  # 50 times faster than dense for 1024 x 100000 A
-    else:  # is dense A
-        # speedup: compute norms along columns at once, and retrieve
-        RowNormSq = norm(A, ord=2, axis=1) ** 2  # timeit same for norm() and A**2.sum(axis=1)
-
-    goodRows = np.unique(A.nonzero()[0])
-
-    x = x0.copy()  # we'll leave the original x0 alone, and make a copy in x
+    # %% disregard all-zero rows of A
+    # norms, nonzero rows and the CSR form are cached on the Operator across calls
+    RowNormSq = A.row_norm_sq
+    goodRows = A.nonzero_rows
+
+    monitor = None if callback is None else Monitor(callback, vector)
+    k = b.shape[1]
+    # With stop_mdp or callback, each sweep over out-of-core A also computes the residual of the
+    # iterate it starts from, kept in the last k columns of X, saving a pass over A from disk.
+    # In memory, the separate forward projection is as fast and stops one sweep earlier.
+    # Only when each row is visited once per sweep, which random sampling does not do.
+    fused = (stop_mdp or monitor is not None) and A.streaming and order != "random"
+
+    # we'll leave the original x0 alone, and make a copy in x
+    X = np.empty((n, 2 * k if fused else k))
+    x = X[:, :k]
+    x[:] = np.reshape(x0, (n, -1))
+    if nonneg:
+        # the row kernel only clamps the entries each row touches
+        x[x < 0] = 0
+
+    rng = np.random.default_rng(seed)
+
+    # in-memory A is a single chunk of rows, out-of-core A is swept one chunk at a time,
+    # with the row order applied within each chunk
+    chunks = _chunk_rows(A, RowNormSq, goodRows, block_size)
+    if block_size > 1 and not A.streaming:
+        blocks = _row_blocks(A.A, b, RowNormSq, chunks[0][2], lamb)
+
+    def converged(i: int, residualNorm) -> bool:
+        """
+        report the residual norm of iteration i, and check the stop rule
+        """
+        if monitor:
+            monitor.report(i, residualNorm, residualNorm**2)
+        if i % 200 == 0:
+            logging.info(f"Iteration {i},  ||residual|| = {residualNorm.max():.2f}")
+        # every right-hand side must satisfy the discrepancy principle
+        return stop_mdp and residualNorm.max() <= taudelta
 
+    # squared residual of the sweep start, from the all-zero rows plus what the sweep adds
+    res2 = np.zeros(k)
+    zero_rows = np.ones(A.shape[0], dtype=bool)
+    zero_rows[goodRows] = False
+    res2_zero = (b[zero_rows] ** 2).sum(axis=0)
+
+    stopped = False
     for i in range(max_iter):  # for each iteration
-        for iRow in goodRows:  # only not all-zero rows
-            # denominator AND numerator are scalar!
-            # den = np.linalg.norm(A[iRow,:],2)**2
-            # print(RowNormSq[iRow] == den)
-            # num = ( b[iRow] - A[iRow,:] @ x )
-            # x += (lamb * num/den) @ A[iRow,:]
-            x += (
-                lamb * (b[iRow] - A[iRow, :] @ x) / RowNormSq[iRow] * A[iRow, :]
-            )  # first two terms are scalar always
-
-            if nonneg:
-                x[x < 0] = 0
-
-        # handle stop rule
-        if stop_mdp:
+        if fused:
+            X[:, k:] = x
+            res2[:] = res2_zero
+
+        for c, (start, stop, items, weights) in enumerate(chunks):
+            seq = _sweep_order(order, len(items), weights, rng)
+            if block_size > 1:
+                if A.streaming:
+                    blocks = _row_blocks(A.row_block(c), b, RowNormSq, items, lamb, start)
+                for j in seq:
+                    Ab, bb, wb = blocks[j]
+                    # one product with A for both the iterate and the sweep start
+                    AX = Ab @ X
+                    if fused:
+                        res2 += ((bb - AX[:, k:]) ** 2).sum(axis=0)
+                    # component averaging within the block
+                    x += Ab.T @ (wb * (bb - AX[:, :k]))
+                    if nonneg:
+                        x[x < 0] = 0
+            elif not A.issparse:
+                # dense A is swept in place, a CSR copy would take 1.5 times its memory
+                kaczmarz_sweep_dense(A.A, b, X, items[seq], RowNormSq, lamb, nonneg, res2)
+            else:
+                # x += lamb * (b[iRow] - A[iRow, :] @ x) / RowNormSq[iRow] * A[iRow, :]
+                Acsr = A.row_block(c)
+                kaczmarz_sweep(
+                    Acsr.indptr,
+                    Acsr.indices,
+                    Acsr.data,
+                    b[start:stop],
+                    X,
+                    items[seq] - start,
+                    RowNormSq[start:stop],
+                    lamb,
+                    nonneg,
+                    res2,
+                )
+
+        if fused:
+            # the sweep has computed the residual of the previous iterate, which is returned
+            # if it satisfies the discrepancy principle, so the extra sweep is discarded
+            if i > 0 and converged(i - 1, np.sqrt(res2)):
+                x = X[:, k:]
+                stopped = True
+                break
+        elif stop_mdp or monitor or (i % 200 == 0 and logging.getLogger().isEnabledFor(logging.INFO)):
+            # a forward projection, only computed when something uses it
+            if monitor:
+                monitor.lap("update")
             residual = b - A @ x
-            residualNorm = norm(residual, 2)
-            if residualNorm <= taudelta:
+            if monitor:
+                monitor.lap("projection")
+            if converged(i, norm(residual, 2, axis=0)):
                 break
-        if i % 200 == 0:
-            residualNorm = norm(b - A @ x, 2)
-            print(f"Iteration {i},  ||residual|| = {residualNorm:.2f}")
+
+    if fused and not stopped:
+        # the residual of the last iterate, which no sweep has computed
+        if monitor:
+            monitor.lap("update")
+        residual = b - A @ x
+        if monitor:
+            monitor.lap("projection")
+        converged(max_iter - 1, norm(residual, 2, axis=0))
+    elif stopped:
+        residual = b - A @ x
+
+    if not stop_mdp:
+        residual = None
+    x = np.ascontiguousarray(x)
+
+    if vector:
+        x = x[:, 0]
+        if residual is not None:
+            residual = residual[:, 0]
 
     return x, residual
+
+
+def _chunk_rows(A, RowNormSq: np.ndarray, goodRows: np.ndarray, block_size: int) -> list:
+    """
+    for each chunk of rows of A: first row, end row, and the rows (block_size == 1)
+    or blocks of rows (block_size > 1) to visit, with their total ||a_i||^2 as sampling weights.
+    The order of goodRows is kept within each chunk.
+    """
+    bounds = A.row_block_bounds
+    chunk = np.searchsorted(bounds, goodRows, side="right") - 1
+
+    chunks = []
+    for k in range(bounds.size - 1):
+        rows = goodRows[chunk == k]
+        if block_size > 1:
+            items = [rows[s : s + block_size] for s in range(0, rows.size, block_size)]
+            weights = np.array([RowNormSq[r].sum() for r in items])
+        else:
+            items = rows
+            weights = RowNormSq[rows]
+        chunks.append((bounds[k], bounds[k + 1], items, weights))
+
+    return chunks
+
+
+def _row_blocks(A, b, RowNormSq: np.ndarray, items: list, lamb: float, start: int = 0) -> list:
+    """
+    precompute for each block of rows the row slice of A, of b and the component averaging
+    weights lamb / sum_j s_j a_ij^2, with s_j the number of rows of the block with a_ij != 0.
+    A holds the rows from "start" on.
+
+    Unlike the Cimmino weights lamb / (block rows * ||a_i||^2), rows of the block that share
+    no column, e.g. parallel rays of one angle, each take a full Kaczmarz step.
+    The spectral radius of the block iteration stays <= 1, so any 0 < lamb < 2 converges.
+    """
+    blocks = []
+    for rows in items:
+        Ab = A[rows - start, :]
+        s = _nnz(Ab, axis=0)
+        sq = Ab.multiply(Ab) if sparse.issparse(Ab) else Ab**2
+        w = lamb / (sq @ s)
+        blocks.append((Ab, b[rows, :], w[:, None]))
+
+    return blocks
+
+
+def _sweep_order(order: str, n: int, weights: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    indices of the n rows (or blocks) to visit in one sweep
+    """
+    if order == "shuffle":
+        return rng.permutation(n)
+    if order == "random":
+        return rng.choice(n, size=n, p=weights / weights.sum())
+
+    if order == "multilevel":
+        return _multilevel_order(n)
+
+    return np.arange(n)
+
+
+@lru_cache(maxsize=16)
+def _multilevel_order(n: int) -> np.ndarray:
+    """
+    permutation of range(n) sorted by bit-reversed index: 0, n/2, n/4, 3n/4, ...
+    Each new index lands as far as possible from the ones already visited.
+    Cached across sweeps and calls, so read-only.
+    """
+    bits = max(int(n - 1).bit_length(), 1)
+    i = np.arange(n)
+    rev = np.zeros(n, dtype=np.int64)
+    for k in range(bits):
+        rev |= ((i >> k) & 1) << (bits - 1 - k)
+
+    perm = np.argsort(rev, kind="stable")
+    perm.setflags(write=False)
+    return perm
@@ -0,0 +1,243 @@
+from __future__ import annotations
+from functools import cached_property
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator
+
+from .rowblock import RowBlockMatrix
+
+
+class Operator:
+    """
+    Projection matrix prepared once for repeated solves.
+
+    Wraps a dense or sparse M x N matrix A and lazily caches the quantities
+    the solvers derive from it (row norms, sums, nonzero rows, transposed copies, ...),
+    so they are computed only on first use and then reused by every solver call.
+    All solvers accept an Operator in place of A.
+
+    >>> op = Operator(A)
+    >>> x = kaczmarz(op, b1)[0]
+    >>> x = logmart(op, b2)[0]
+
+    A may also be an out-of-core airtools.RowBlockMatrix, in which case every
+    quantity is computed one block of rows at a time.
+
+    A may also be a matrix-free scipy.sparse.linalg.LinearOperator with matvec and
+    rmatvec, for solvers that use only products with A and A.T (maxent, csvd).
+
+    The wrapped matrix must not be modified afterwards.
+    """
+
+    def __init__(self, A):
+        if isinstance(A, Operator):
+            A = A.A
+
+        if isinstance(A, (RowBlockMatrix, LinearOperator)):
+            pass
+        elif sp.issparse(A):
+            A = sp.csr_matrix(A)
+            if not A.has_canonical_format:
+                A = A.copy()
+                A.sum_duplicates()
+        else:
+            A = np.atleast_2d(np.asarray(A))
+
+        if A.ndim != 2:
+            raise ValueError("A must be a matrix")
+
+        self.A = A
+        self.shape = A.shape
+        self.ndim = 2
+        self.streaming = isinstance(A, RowBlockMatrix)
+        self.matrix_free = isinstance(A, LinearOperator)
+        self.issparse = self.streaming or self.matrix_free or sp.issparse(A)
+
+    def __repr__(self) -> str:
+        if self.matrix_free:
+            kind = "matrix-free"
+        else:
+            kind = "out-of-core" if self.streaming else "sparse" if self.issparse else "dense"
+        return f"Operator({kind} {self.shape[0]} x {self.shape[1]})"
+
+    def __matmul__(self, x):
+        return self.A @ x
+
+    def dot(self, x, out=None):
+        """
+        forward projection A @ x, written into "out" if given
+        """
+        return _product(self.A, x, out)
+
+    def rmatvec(self, y, out=None):
+        """
+        back projection A.T @ y, written into "out" if given
+        """
+        return _product(self.T, y, out)
+
+    @cached_property
+    def row_block_bounds(self) -> np.ndarray:
+        """
+        first row of each block of rows, and M. A single block for in-memory A.
+        """
+        if self.streaming:
+            return self.A.bounds
+        return np.array([0, self.shape[0]])
+
+    def row_block(self, k: int):
+        """
+        block k of rows: the matrix itself for in-memory A, read from disk for out-of-core A
+        """
+        if self.matrix_free:
+            raise ValueError("matrix-free A has only products with A and A.T")
+        if self.streaming:
+            return self.A.block(k)
+        return self.A
+
+    def row_blocks(self):
+        """
+        yield first row, end row, block of rows
+        """
+        bounds = self.row_block_bounds
+        for k in range(bounds.size - 1):
+            yield bounds[k], bounds[k + 1], self.row_block(k)
+
+    def _col_reduce(self, f, dtype=float) -> np.ndarray:
+        """
+        sum over the blocks of rows of the column quantity f(block)
+        """
+        total = np.zeros(self.shape[1], dtype=dtype)
+        for _, _, Ab in self.row_blocks():
+            total += f(Ab)
+        return total
+
+    @cached_property
+    def T(self):
+        """
+        transpose of A, as CSR for sparse A so back projection walks rows
+        """
+        if self.streaming or self.matrix_free:
+            return self.A.T
+        if self.issparse:
+            return self.A.T.tocsr()
+        return self.A.T
+
+    @cached_property
+    def csr(self) -> sp.csr_matrix:
+        """
+        A as canonical CSR, also for dense A
+        """
+        if self.streaming:
+            raise ValueError("out-of-core A is only available by blocks of rows")
+        if self.matrix_free:
+            raise ValueError("matrix-free A has only products with A and A.T")
+        if self.issparse:
+            return self.A
+        return sp.csr_matrix(self.A)
+
+    @cached_property
+    def csc(self) -> sp.csc_matrix:
+        return self.csr.tocsc()
+
+    @cached_property
+    def fortran_array(self) -> np.ndarray:
+        """
+        dense A as Fortran-ordered float64, as used by the compiled Fortran backend
+        """
+        if self.issparse:
+            raise ValueError("A is sparse")
+        return np.asfortranarray(self.A, dtype=np.float64)
+
+    @cached_property
+    def row_norm_sq(self) -> np.ndarray:
+        """
+        ||a_i||^2 of each row
+        """
+        return np.concatenate([_norm_sq(Ab, axis=1) for _, _, Ab in self.row_blocks()])
+
+    @cached_property
+    def col_norm_sq(self) -> np.ndarray:
+        """
+        ||a^j||^2 of each column
+        """
+        return self._col_reduce(lambda Ab: _norm_sq(Ab, axis=0))
+
+    @cached_property
+    def row_sum(self) -> np.ndarray:
+        return np.concatenate(
+            [np.asarray(Ab.sum(axis=1)).reshape(-1) for _, _, Ab in self.row_blocks()]
+        )
+
+    @cached_property
+    def col_sum(self) -> np.ndarray:
+        return self._col_reduce(lambda Ab: np.asarray(Ab.sum(axis=0)).reshape(-1))
+
+    @cached_property
+    def total_sum(self) -> float:
+        """
+        sum of all elements of A
+        """
+        return float(self.row_sum.sum())
+
+    @cached_property
+    def row_nnz(self) -> np.ndarray:
+        """
+        number of nonzero elements of each row
+        """
+        return np.concatenate([_nnz(Ab, axis=1) for _, _, Ab in self.row_blocks()])
+
+    @cached_property
+    def col_nnz(self) -> np.ndarray:
+        return self._col_reduce(lambda Ab: _nnz(Ab, axis=0), dtype=np.intp)
+
+    @cached_property
+    def nonzero_rows(self) -> np.ndarray:
+        """
+        indices of the rows that are not all zero
+        """
+        return np.flatnonzero(self.row_norm_sq)
+
+    @cached_property
+    def nonnegative(self) -> bool:
+        """
+        True if all elements of A are >= 0
+        """
+        for _, _, Ab in self.row_blocks():
+            if ((Ab.data if sp.issparse(Ab) else Ab) < 0).any():
+                return False
+        return True
+
+
+def _product(A, x, out):
+    """
+    A @ x into out. Only dense A multiplies without a temporary.
+    """
+    if out is None:
+        return A @ x
+    if isinstance(A, np.ndarray):
+        return np.matmul(A, x, out=out)
+
+    out[...] = A @ x
+    return out
+
+
+def _norm_sq(A, axis: int) -> np.ndarray:
+    if sp.issparse(A):
+        return np.asarray(A.multiply(A).sum(axis=axis)).reshape(-1)
+    return np.linalg.norm(A, ord=2, axis=axis) ** 2
+
+
+def _nnz(A, axis: int) -> np.ndarray:
+    if sp.issparse(A):
+        return A.getnnz(axis=axis)
+    return np.count_nonzero(A, axis=axis)
+
+
+def as_operator(A) -> Operator:
+    """
+    return A if it already is an Operator, else wrap it
+    """
+    if isinstance(A, Operator):
+        return A
+    return Operator(A)
@@ -1,6 +1,14 @@
 from __future__ import annotations
 import numpy as np
-import math
+
+from . import _fortran
+from ._monitor import Monitor
+from .linop import as_operator
+
+BACKENDS = ("auto", "numpy", "fortran")
+# above about this many elements of A, NumPy's BLAS products outrun the Fortran matmul intrinsic
+# (see benchmarks/logmart_backend.py)
+FORTRAN_AUTO_SIZE = 100_000
 
 """
 solve b=Ax using parallel log-entropy MART  (De Pierro 1991)
@@ -18,6 +26,8 @@ def logmart(
     x0: float | None = None,
     sigma: float = 1.0,
     max_iter: int = 20,
+    backend: str = "auto",
+    callback=None,
 ) -> tuple:
     """
     estimation halted based on chi**2 value
@@ -25,15 +35,27 @@ def logmart(
 
     Parameters
     ----------
-    A: numpy.ndarray
+    A: numpy.ndarray, scipy.sparse matrix or airtools.Operator
         NxM array "projection"
     b: numpy.ndarray
-        N column vector "observation"
+        N column vector "observation", or N x K matrix of K observations solved together
+    backend: str
+        "numpy", "fortran" for the compiled fortran/logmart.f90 (dense A and vector b only),
+        or "auto" to use Fortran when its library is built and the problem is small, dense
+        with vector b
+    callback: callable
+        called after every iteration as callback(info), with info a dict of "iteration",
+        "residual" ||b - A x||, "objective" chi**2 as returned and "time" per phase.
+        NumPy backend only.
 
     Returns
     -------
     x_est: numpy.ndarray
-        M column vector estimate of "true" x in b = A @ x
+        M column vector estimate of "true" x in b = A @ x, M x K if b is N x K
+    chi2: float or numpy.ndarray
+        chi**2 of the last iteration, per column of b
+    i: int or numpy.ndarray
+        last iteration, per column of b. Each column stops when its own chi**2 increases.
 
     Matlab logmart.m AUTHOR: Joshua Semeter 5-2015
 
@@ -42,58 +64,136 @@ def logmart(
     >>> b = A @ x
     """
     # %% parameter check
-    if b.ndim != 1:
-        raise ValueError("y must be a column vector")
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    A = as_operator(A)
+    if b.ndim not in (1, 2):
+        raise ValueError("b must be a column vector or a matrix of column vectors")
     if A.ndim != 2:
         raise ValueError("A must be a matrix")
-    if A.shape[0] != b.size:
+    if A.shape[0] != b.shape[0]:
         raise ValueError("A and b: number of rows must match")
     if not isinstance(relax, (int, float)):
         raise ValueError("relax is a scalar float")
-    if (A < 0).any():
+    if not A.nonnegative:
         raise ValueError("A must be all non-negative")
     if (b < 0).any():
         raise ValueError("b must be all non-negative")
 
-    b = b.copy()  # needed to avoid modifying outside this function!
+    vector = b.ndim == 1
+    # always iterate on N x K, K=1 for vector b
+    b = b.reshape(b.shape[0], -1).astype(float)  # copy needed to avoid modifying outside this function!
+    n = A.shape[1]
     # %% make sure there are no 0's in b
     b[b <= 1e-8] = 1e-8
     # %% set defaults
     if x0 is None:  # backproject
-        x = A.T @ b / A.sum()
-        x *= b.max() / (A @ x).max()
+        x = A.T @ b / A.total_sum
+        x *= b.max(axis=0) / (A @ x).max(axis=0)
     elif isinstance(x0, (float, int)) or x0.size == 1:  # replicate
-        x = x0 * np.ones_like(b)
+        x = np.full((n, b.shape[1]), x0, dtype=float)
     else:
-        x = x0
-    if not x.size == A.shape[1]:
-        raise ValueError("x0 must be scalar or match Ncolumns of A")
+        if x0.shape[0] != n:
+            raise ValueError("x0 must be scalar or match Ncolumns of A")
+        x = np.empty((n, b.shape[1]))
+        x[:] = x0.reshape(n, -1)
 
     x[x < 1e-8] = 1e-8
+
+    fortran_ok = vector and not A.issparse and callback is None
+    if backend == "fortran" and not fortran_ok:
+        raise ValueError("Fortran logmart requires dense A and vector b, without callback")
+    if backend == "auto":
+        backend = "fortran" if fortran_ok and A.shape[0] * A.shape[1] <= FORTRAN_AUTO_SIZE else "numpy"
+        if not _fortran.available():
+            backend = "numpy"
+    if backend == "fortran":
+        return _fortran.logmart(A.fortran_array, b[:, 0], relax, x[:, 0], sigma, max_iter)
+
     # W=sigma;
     # W=linspace(1,0,size(A,1))';
     # W=rand(size(A,1),1);
-    W = np.ones(A.shape[0])
+    W = np.ones((A.shape[0], 1))
     W = W / W.sum()
 
-    chi2 = chi_squared(A, b, x, sigma)
+    m, k = b.shape
+    # work buffers, so the iterations allocate nothing beyond the sparse products
+    xA = A.dot(x, out=np.empty((m, k)))
+    tmp = np.empty((m, k))
+    xAT = np.empty((n, k))
+    x_prev = x.copy()
+    t = np.empty(k)
+    chi2 = np.empty(k)
+    chinew = np.empty(k)
+    chiold = np.empty(k)
+    last = np.full(k, max_iter - 1)
+    # columns still iterating. Stopped columns are carried along unchanged,
+    # so every product with A stays one matrix-matrix product.
+    active = np.ones(k, dtype=bool)
+
+    _chi_squared(xA, b, sigma, tmp, chi2)
+    monitor = None if callback is None else Monitor(callback, vector)
     # %%  iterate solution, plot estimated data (diag elems of x#A)
+    # xA = A @ x is kept from the chi**2 of the previous iteration: one forward and one back projection
     for i in range(max_iter):
-        x_prev = x
-        xA = A @ x
-        t = (1 / xA).min()
-        C = relax * t * (1 - xA / b)
-        x /= 1 - x * (A.T @ (W * C))
+        np.copyto(x_prev, x, where=active)
+        # t = (1 / xA).min(axis=0)
+        np.divide(1, xA, out=tmp)
+        tmp.min(axis=0, out=t)
+        # C = relax * t * (1 - xA / b)
+        np.divide(xA, b, out=tmp)
+        np.subtract(1, tmp, out=tmp)
+        tmp *= relax * t
+        # x /= 1 - x * (A.T @ (W * C))
+        tmp *= W
+        if monitor:
+            monitor.lap("update")
+        A.rmatvec(tmp, out=xAT)
+        if monitor:
+            monitor.lap("backprojection")
+        xAT *= x
+        np.subtract(1, xAT, out=xAT)
+        xAT[:, ~active] = 1
+        x /= xAT
         # %% monitor solution
-        chiold = chi2
-        chi2 = chi_squared(A, b, x, sigma)
-        if i > 1 and chi2 >= chiold:
-            break
+        if monitor:
+            monitor.lap("update")
+        A.dot(x, out=xA)
+        if monitor:
+            monitor.lap("projection")
+        np.copyto(chiold, chi2)
+        _chi_squared(xA, b, sigma, tmp, chinew)
+        np.copyto(chi2, chinew, where=active)
+        if monitor:
+            monitor.report(i, sigma * chi2, chi2)
+        if i > 1:
+            stop = active & (chi2 >= chiold)
+            last[stop] = i
+            active &= ~stop
+            if not active.any():
+                break
         # if chi2 < 0.7:
         #    break
 
-    return x_prev, chi2, i
+    if vector:
+        return x_prev[:, 0], float(chi2[0]), int(last[0])
+
+    return x_prev, chi2, last
 
 
-def chi_squared(A, b, x, sigma: float) -> float:
-    return math.sqrt((((A @ x - b) / sigma) ** 2).sum())
+def chi_squared(A, b, x, sigma: float):
+    """
+    chi**2 of each column of x
+    """
+    return np.sqrt((((A @ x - b) / sigma) ** 2).sum(axis=0))
+
+
+def _chi_squared(xA, b, sigma: float, tmp, out) -> None:
+    """
+    chi**2 of each column from the forward projection xA = A @ x, using work buffer tmp
+    """
+    np.subtract(xA, b, out=tmp)
+    tmp /= sigma
+    np.square(tmp, out=tmp)
+    tmp.sum(axis=0, out=out)
+    np.sqrt(out, out=out)
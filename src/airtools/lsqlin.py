@@ -1,7 +1,8 @@
 """
     A simple library to solve constrained linear least squares problems
     with sparse and dense matrices. Uses cvxopt library for
-    optimization
+    optimization with linear constraints, scipy for bounds only.
+    cvxopt is optional: without it, lsqnonneg and lsqlin with only bounds still work.
 
     See http://maggotroot.blogspot.ch/2013/11/constrained-linear-least-squares-in.html for more info
 """
@@ -13,21 +14,69 @@ __date__ = "22.11.2013"
 __license__ = "MIT"
 
 import numpy as np
-from cvxopt import solvers, matrix, spmatrix
 from scipy import sparse
+from scipy.optimize import lsq_linear, nnls
+from scipy.sparse.linalg import LinearOperator
+
+from .csvd import csvd
+from .linop import Operator, as_operator
+
+try:
+    from cvxopt import solvers, matrix, spmatrix
+except ImportError:
+    solvers = matrix = spmatrix = None
+
+SOLVERS = ("auto", "cvxopt", "lsq_linear")
+NNLS_SOLVERS = ("auto", "nnls", "projected_gradient", "cvxopt")
+# largest dense problem (number of unknowns) lsqnonneg "auto" solves by active set
+NNLS_AUTO_SIZE = 2000
+# integer type of cvxopt index matrices, typecode "i"
+INDEX_DTYPE = np.asarray(matrix(0, (1, 1))).dtype if matrix is not None else np.dtype(np.int64)
+
+
+def is_spmatrix(A) -> bool:
+    return spmatrix is not None and isinstance(A, spmatrix)
+
+
+def is_cvxopt_matrix(A) -> bool:
+    return matrix is not None and isinstance(A, matrix)
+
+
+def _require_cvxopt(what: str) -> None:
+    if solvers is None:
+        raise ImportError(f"{what} needs cvxopt:  pip install cvxopt")
 
 
 def scipy_sparse_to_spmatrix(A):
-    coo = A.tocoo()
-    SP = spmatrix(coo.data, coo.row.tolist(), coo.col.tolist())
-    return SP
+    """
+    scipy.sparse matrix to CVXOPT spmatrix.
+    The value and index arrays are handed to CVXOPT matrices through the buffer protocol,
+    sorted by column as in CVXOPT's compressed column storage.
+    """
+    csc = sparse.csc_matrix(A)
+    if not csc.has_canonical_format:
+        csc = csc.copy()
+        csc.sum_duplicates()
+    coo = csc.tocoo()
+
+    return spmatrix(
+        matrix(np.asarray(coo.data, dtype=float)),
+        matrix(coo.row.astype(INDEX_DTYPE, copy=False)),
+        matrix(coo.col.astype(INDEX_DTYPE, copy=False)),
+        A.shape,
+    )
 
 
 def spmatrix_sparse_to_scipy(A):
-    data = np.array(A.V).squeeze()
-    rows = np.array(A.I).squeeze()
-    cols = np.array(A.J).squeeze()
-    return sparse.coo_matrix((data, (rows, cols)))
+    """
+    CVXOPT spmatrix to scipy.sparse CSC matrix, from its compressed column storage.
+    The arrays are NumPy views of the CVXOPT matrices.
+    """
+    colptr, rowind, values = A.CCS
+    return sparse.csc_matrix(
+        (np.asarray(values).ravel(), np.asarray(rowind).ravel(), np.asarray(colptr).ravel()),
+        shape=A.size,
+    )
 
 
 def sparse_None_vstack(A1, A2):
@@ -37,15 +86,6 @@ def sparse_None_vstack(A1, A2):
         return sparse.vstack([A1, A2])
 
 
-def numpy_None_vstack(A1, A2):
-    if A1 is None:
-        return A2
-    elif isinstance(A1, np.ndarray):
-        return np.vstack([A1, A2])
-    elif isinstance(A1, spmatrix):
-        return np.vstack([cvxopt_to_numpy_matrix(A1).todense(), A2])
-
-
 def numpy_None_concatenate(A1, A2):
     if A1 is None:
         return A2
@@ -53,13 +93,6 @@ def numpy_None_concatenate(A1, A2):
         return np.concatenate([A1, A2])
 
 
-def get_shape(A):
-    if isinstance(A, spmatrix):
-        return A.size
-    else:
-        return A.shape
-
-
 def numpy_to_cvxopt_matrix(A):
     if A is None:
         return
@@ -71,6 +104,8 @@ def numpy_to_cvxopt_matrix(A):
             return A
     else:
         if isinstance(A, np.ndarray):
+            # float64 is copied through the buffer protocol, other types element by element
+            A = np.asarray(A, dtype=float)
             if A.ndim == 1:
                 return matrix(A, (A.shape[0], 1), "d")
             else:
@@ -82,15 +117,31 @@ def numpy_to_cvxopt_matrix(A):
 def cvxopt_to_numpy_matrix(A):
     if A is None:
         return
-    if isinstance(A, spmatrix):
+    if is_spmatrix(A):
         return spmatrix_sparse_to_scipy(A)
-    elif isinstance(A, matrix):
+    elif is_cvxopt_matrix(A):
         return np.asarray(A).squeeze()
     else:
         return np.asarray(A).squeeze()
 
 
-def lsqlin(C, d, reg=0, A=None, b=None, Aeq=None, beq=None, lb=None, ub=None, x0=None, opts=None):
+def lsqlin(
+    C,
+    d,
+    reg=0,
+    A=None,
+    b=None,
+    Aeq=None,
+    beq=None,
+    lb=None,
+    ub=None,
+    x0=None,
+    opts=None,
+    *,
+    solver="auto",
+    max_iter=None,
+    tol=1e-10,
+):
     """
     Solve linear constrained l2-regularized least squares. Can
     handle both dense and sparse matrices. Matlab's lsqlin
@@ -111,85 +162,362 @@ def lsqlin(C, d, reg=0, A=None, b=None, Aeq=None, beq=None, lb=None, ub=None, x0
         beq is q x 1 dense matrix
         lb  is n x 1 matrix or scalar
         ub  is n x 1 matrix or scalar
+        solver is "cvxopt", "lsq_linear" or "auto"
+        opts are the CVXOPT options of the "cvxopt" solver
+        max_iter, tol are the iteration limit and tolerance of the "lsq_linear" solver,
+            by default those of scipy.optimize.lsq_linear
+
+    Solvers:
+        "cvxopt" forms Q = C'*C and solves the QP with CVXOPT, bounds become
+            sparse inequality rows.
+        "lsq_linear" passes the bounds to scipy.optimize.lsq_linear, which works
+            on C directly without forming Q or constraint rows: BVLS for dense C,
+            trust-region reflective with LSMR for sparse C. Only for problems
+            without A, b, Aeq, beq, x0 is not used.
+        "auto" uses "lsq_linear" when there are only bounds, else "cvxopt".
+
+    For repeated solves with only d changing, use LsqlinProblem.
 
     Output arguments:
         Return dictionary, the output of CVXOPT QP.
+        For "lsq_linear", a dictionary with "x" as 1-D NumPy array, "status",
+        "iterations" and "message". So with solver "auto", problems with only bounds
+        no longer return the CVXOPT dictionary with "x" as n x 1 cvxopt matrix:
+        pass solver="cvxopt" for that.
 
     Dont pass matlab-like empty lists to avoid setting parameters,
     just use None:
         lsqlin(C, d, 0.05, None, None, Aeq, beq) #Correct
         lsqlin(C, d, 0.05, [], [], Aeq, beq) #Wrong!
     """
-    if sparse.issparse(A):  # detects both np and cxopt sparse
-        sparse_case = True
-        # We need A to be scipy sparse, as I couldn't find how
-        # CVXOPT spmatrix can be vstacked
-        if isinstance(A, spmatrix):
-            A = spmatrix_sparse_to_scipy(A)
-    else:
-        sparse_case = False
+    return LsqlinProblem(
+        C, reg, A, b, Aeq, beq, lb, ub, opts, solver=solver, max_iter=max_iter, tol=tol
+    ).solve(d, x0)
 
-    C = numpy_to_cvxopt_matrix(C)
-    d = numpy_to_cvxopt_matrix(d)
-    Q = C.T * C
-    q = -d.T * C
-    nvars = C.size[1]
 
-    if reg > 0:
-        if sparse_case:
-            i = scipy_sparse_to_spmatrix(sparse.eye(nvars, nvars, format="coo"))
-        else:
-            i = matrix(np.eye(nvars), (nvars, nvars), "d")
-        Q = Q + reg * i
+class LsqlinProblem:
+    """
+    lsqlin problem prepared once for repeated solves with the same C, reg,
+    constraints and bounds, where only d changes.
 
-    lb = cvxopt_to_numpy_matrix(lb)
-    ub = cvxopt_to_numpy_matrix(ub)
-    b = cvxopt_to_numpy_matrix(b)
+    The constraint assembly, the conversions to CVXOPT and Q = C'*C + reg*I
+    are done once, and each solve() only forms q = -C'*d.
+    With warm_start, each CVXOPT solve starts from the primal and dual solution
+    of the previous one, which typically takes a few interior-point iterations
+    instead of 15 or more.
 
-    if lb is not None:  # Modify 'A' and 'b' to add lb inequalities
-        if lb.size == 1:
-            lb = np.repeat(lb, nvars)
+        P = LsqlinProblem(C, 0.05, A, b, lb=0, opts={"show_progress": False})
+        for d in data:
+            x = P.solve(d)["x"]
 
-        if sparse_case:
-            lb_A = -sparse.eye(nvars, nvars, format="coo")
-            A = sparse_None_vstack(A, lb_A)
+    Input arguments are those of lsqlin(), without d and x0.
+
+    An LsqlinProblem keeps the previous solution for the warm start, so use one per thread.
+    lsqlin() itself is safe to call from several threads at once.
+    """
+
+    def __init__(
+        self,
+        C,
+        reg=0,
+        A=None,
+        b=None,
+        Aeq=None,
+        beq=None,
+        lb=None,
+        ub=None,
+        opts=None,
+        *,
+        solver="auto",
+        warm_start=True,
+        max_iter=None,
+        tol=1e-10,
+    ):
+        if solver not in SOLVERS:
+            raise ValueError(f"solver must be one of {SOLVERS}")
+
+        bounds_only = A is None and b is None and Aeq is None and beq is None
+        if solver == "auto":
+            solver = "lsq_linear" if bounds_only else "cvxopt"
+
+        if isinstance(C, Operator):
+            C = _as_scipy(C)
+
+        self.solver = solver
+        self.opts = {} if opts is None else opts
+        self.warm_start = warm_start
+        self.max_iter = max_iter
+        self.tol = tol
+        self._initvals = None
+
+        if solver == "lsq_linear":
+            if not bounds_only:
+                raise ValueError("solver lsq_linear handles bounds only, use solver cvxopt")
+            self._prepare_lsq_linear(C, reg, lb, ub)
         else:
-            lb_A = -np.eye(nvars)
-            A = numpy_None_vstack(A, lb_A)
-        b = numpy_None_concatenate(b, -lb)
-    if ub is not None:  # Modify 'A' and 'b' to add ub inequalities
-        if ub.size == 1:
-            ub = np.repeat(ub, nvars)
-        if sparse_case:
-            ub_A = sparse.eye(nvars, nvars, format="coo")
-            A = sparse_None_vstack(A, ub_A)
+            _require_cvxopt("lsqlin with linear constraints")
+            self._prepare_qp(C, reg, A, b, Aeq, beq, lb, ub)
+
+    def solve(self, d, x0=None) -> dict:
+        """
+        solve for right-hand side d
+
+        x0: initial point of CVXOPT QP, overriding the warm start
+        """
+        if self.solver == "lsq_linear":
+            return self._solve_lsq_linear(d)
+        return self._solve_qp(d, x0)
+
+    def _prepare_qp(self, C, reg, A, b, Aeq, beq, lb, ub) -> None:
+        if is_spmatrix(A):
+            # We need A to be scipy sparse, as I couldn't find how
+            # CVXOPT spmatrix can be vstacked
+            A = spmatrix_sparse_to_scipy(A)
+
+        C = numpy_to_cvxopt_matrix(C)
+        Q = C.T * C
+        nvars = C.size[1]
+
+        if reg > 0:
+            Q = Q + reg * scipy_sparse_to_spmatrix(sparse.eye(nvars, nvars, format="coo"))
+
+        lb = cvxopt_to_numpy_matrix(lb)
+        ub = cvxopt_to_numpy_matrix(ub)
+        b = cvxopt_to_numpy_matrix(b)
+
+        # bounds are sparse inequality rows, so A is made sparse too
+        if (lb is not None or ub is not None) and A is not None and not sparse.issparse(A):
+            A = sparse.coo_matrix(A)
+
+        if lb is not None:  # Modify 'A' and 'b' to add lb inequalities
+            if lb.size == 1:
+                lb = np.repeat(lb, nvars)
+            A = sparse_None_vstack(A, -sparse.eye(nvars, nvars, format="coo"))
+            b = numpy_None_concatenate(b, -lb)
+        if ub is not None:  # Modify 'A' and 'b' to add ub inequalities
+            if ub.size == 1:
+                ub = np.repeat(ub, nvars)
+            A = sparse_None_vstack(A, sparse.eye(nvars, nvars, format="coo"))
+            b = numpy_None_concatenate(b, ub)
+
+        # Convert data to CVXOPT format
+        self._C = C
+        self._Q = Q
+        self._G = numpy_to_cvxopt_matrix(A)
+        self._h = numpy_to_cvxopt_matrix(b)
+        self._Aeq = numpy_to_cvxopt_matrix(Aeq)
+        self._beq = numpy_to_cvxopt_matrix(beq)
+
+    def _solve_qp(self, d, x0) -> dict:
+        q = -self._C.T * numpy_to_cvxopt_matrix(d)
+
+        if x0 is not None:
+            initvals = x0 if isinstance(x0, dict) else {"x": numpy_to_cvxopt_matrix(x0)}
         else:
-            ub_A = np.eye(nvars)
-            A = numpy_None_vstack(A, ub_A)
-        b = numpy_None_concatenate(b, ub)
+            initvals = self._initvals
+
+        # opts override the global solvers.options for this call only,
+        # so concurrent calls with different opts don't interfere
+        options = {**solvers.options, **self.opts}
+
+        # Run CVXOPT.SQP solver
+        args = (self._Q, q, self._G, self._h, self._Aeq, self._beq)
+        try:
+            sol = solvers.qp(*args, initvals=initvals, options=options)
+        except (ValueError, ArithmeticError):
+            # the KKT system may be singular from a warm start on the boundary
+            if initvals is None:
+                raise
+            sol = solvers.qp(*args, options=options)
+
+        if self.warm_start and sol["status"] == "optimal":
+            self._initvals = {"x": sol["x"]}
+            if self._G is not None:
+                self._initvals.update(s=_interior(sol["s"]), z=_interior(sol["z"]))
+            if self._Aeq is not None:
+                self._initvals["y"] = sol["y"]
+
+        return sol
+
+    def _prepare_lsq_linear(self, C, reg, lb, ub) -> None:
+        """
+        bound-constrained least squares by scipy.optimize.lsq_linear, without forming C'*C.
+        reg adds the rows sqrt(reg)*I to C: sparse rows for sparse C, and for dense C
+        a LinearOperator, so neither the n x n identity nor a copy of C is formed.
+        """
+        C = _as_scipy(C)
+        nvars = C.shape[1]
+
+        if reg > 0:
+            if sparse.issparse(C):
+                C = sparse.vstack(
+                    [C, np.sqrt(reg) * sparse.eye(nvars, format="csr")], format="csr"
+                )
+            else:
+                C = _regularized_operator(np.asarray(C, dtype=float), np.sqrt(reg))
+
+        self._C = C
+        # zero right-hand side of the reg rows
+        self._pad = nvars if reg > 0 else 0
+        if isinstance(C, np.ndarray):
+            self._method = {"method": "bvls"}
+        else:
+            self._method = {"method": "trf", "lsq_solver": "lsmr", "lsmr_tol": "auto"}
+        self._bounds = (
+            np.broadcast_to(-np.inf if lb is None else np.asarray(lb, dtype=float).ravel(), nvars),
+            np.broadcast_to(np.inf if ub is None else np.asarray(ub, dtype=float).ravel(), nvars),
+        )
+
+    def _solve_lsq_linear(self, d) -> dict:
+        d = np.asarray(d, dtype=float).ravel()
+        if self._pad:
+            d = np.concatenate([d, np.zeros(self._pad)])
+
+        res = lsq_linear(
+            self._C,
+            d,
+            bounds=self._bounds,
+            tol=self.tol,
+            max_iter=self.max_iter,
+            **self._method,
+        )
+
+        return {
+            "x": res.x,
+            "status": "optimal" if res.success else "unknown",
+            "iterations": res.nit,
+            "message": res.message,
+        }
+
+
+def _regularized_operator(C: np.ndarray, s: float) -> LinearOperator:
+    """
+    [C; s*I] as a LinearOperator on the dense C
+    """
+    m, n = C.shape
 
-    # Convert data to CVXOPT format
-    A = numpy_to_cvxopt_matrix(A)
-    Aeq = numpy_to_cvxopt_matrix(Aeq)
-    b = numpy_to_cvxopt_matrix(b)
-    beq = numpy_to_cvxopt_matrix(beq)
+    def matvec(x):
+        x = np.ravel(x)
+        return np.concatenate([C @ x, s * x])
 
-    # Set up options
-    if opts is not None:
-        for k, v in opts.items():
-            solvers.options[k] = v
+    def rmatvec(y):
+        y = np.ravel(y)
+        return C.T @ y[:m] + s * y[m:]
 
-    # Run CVXOPT.SQP solver
-    sol = solvers.qp(Q, q.T, A, b, Aeq, beq, None, x0)
-    return sol
+    return LinearOperator((m + n, n), matvec=matvec, rmatvec=rmatvec, dtype=float)
 
 
-def lsqnonneg(C, d, opts):
+def _interior(v):
+    """
+    slack or multiplier of a previous solution, lifted off zero to warm-start the interior point
+    """
+    v = np.array(v)
+    return matrix(np.maximum(v, 1e-6 * v.max(initial=0.0)))
+
+
+def _as_scipy(C):
+    """
+    CVXOPT matrices to scipy.sparse CSR or NumPy, and airtools.Operator to the matrix it wraps
+    """
+    if isinstance(C, Operator):
+        if C.streaming or C.matrix_free:
+            raise ValueError("lsqlin needs C in memory, not out-of-core or matrix-free")
+        return C.A
+    if is_spmatrix(C):
+        return spmatrix_sparse_to_scipy(C).tocsr()
+    if is_cvxopt_matrix(C):
+        return np.array(C)
+    return C
+
+
+def lsqnonneg(C, d, opts=None, *, solver="auto", max_iter=None, tol: float = 1e-8):
     """
     Solves nonnegative linear least-squares problem:
 
     min_x ||C*x - d||_2^2,  where x >= 0
+
+    Solvers:
+        "nnls" Lawson-Hanson active set of scipy.optimize.nnls, exact, for dense C.
+            At most max_iter iterations (default 3 * number of unknowns); if it does not
+            converge within them, "projected_gradient" is used instead.
+        "projected_gradient" accelerated projected gradient (FISTA with adaptive restart),
+            only products with C and C', so C may be sparse or an airtools.Operator.
+            Stops when the projected gradient step is below tol relative to ||C'*d||,
+            or after max_iter (default 5000) iterations.
+        "cvxopt" interior point QP by lsqlin
+        "auto" "nnls" for dense C with at most NNLS_AUTO_SIZE columns, else "projected_gradient"
+
+    opts are the CVXOPT options of the "cvxopt" solver, and are ignored by the others,
+    so options written for CVXOPT, e.g. {"maxiters": 10}, work with every solver.
+
+    Output arguments:
+        For "cvxopt" the output of CVXOPT QP,
+        else a dictionary with "x" as NumPy array, "status", "iterations" and "message".
     """
-    return lsqlin(
-        C, d, reg=0, A=None, b=None, Aeq=None, beq=None, lb=0, ub=None, x0=None, opts=opts
-    )
+    if solver not in NNLS_SOLVERS:
+        raise ValueError(f"solver must be one of {NNLS_SOLVERS}")
+
+    if solver == "cvxopt":
+        return lsqlin(C, d, lb=0, opts=opts, solver="cvxopt")
+
+    # an Operator keeps its cached quantities, and may be out-of-core or matrix-free
+    A = as_operator(C if isinstance(C, Operator) else _as_scipy(C))
+    d = np.asarray(d, dtype=float).ravel()
+
+    if solver == "auto":
+        small = not A.issparse and A.shape[1] <= NNLS_AUTO_SIZE
+        solver = "nnls" if small else "projected_gradient"
+
+    if solver == "nnls":
+        try:
+            x = nnls(A.csr.toarray() if A.issparse else A.A, d, maxiter=max_iter)[0]
+            return {"x": x, "status": "optimal", "iterations": None, "message": "nnls"}
+        except RuntimeError:
+            # scipy.optimize.nnls raises at its iteration limit instead of returning its iterate
+            pass
+
+    return _nnls_projected_gradient(A, d, tol, 5000 if max_iter is None else max_iter)
+
+
+def _nnls_projected_gradient(A, d, tol: float, max_iter: int) -> dict:
+    """
+    FISTA for min ||C*x - d||^2, x >= 0 with step 1/||C||_2^2 and adaptive restart.
+
+    Reference: B. O'Donoghue and E. Candes, "Adaptive Restart for Accelerated Gradient Schemes",
+    Foundations of Computational Mathematics 15, 2015.
+    """
+    m, n = A.shape
+
+    # Lipschitz constant ||C||_2^2 of the gradient C'*(C*x - d)
+    if m == 1:
+        L = np.linalg.norm(A.rmatvec(np.ones(1))) ** 2
+    elif n == 1:
+        L = np.linalg.norm(A.dot(np.ones(1))) ** 2
+    else:
+        L = csvd(A, 1, method="svds", seed=0)[1][0] ** 2
+    Ctd = A.rmatvec(d)
+    stop = tol * np.linalg.norm(Ctd)
+
+    x = np.zeros(n)
+    y = x.copy()
+    t = 1.0
+    status = "unknown"
+    it = 0
+    while it < max_iter:
+        it += 1
+        x_new = np.maximum(y - (A.rmatvec(A.dot(y)) - Ctd) / L, 0)
+        if np.linalg.norm(x_new - y) * L <= stop:
+            x = x_new
+            status = "optimal"
+            break
+
+        t_new = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        if (y - x_new) @ (x_new - x) > 0:
+            # restart the momentum when it points uphill
+            t_new = 1.0
+            y = x_new
+        else:
+            y = x_new + (t - 1) / t_new * (x_new - x)
+        x, t = x_new, t_new
+
+    return {"x": x, "status": status, "iterations": it, "message": "projected gradient"}
@@ -1,11 +1,67 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
 from warnings import warn
 
-from numpy import atleast_2d, log, atleast_1d, zeros, ones, empty, spacing, array
+from numpy import (
+    log,
+    log1p,
+    atleast_1d,
+    zeros,
+    ones,
+    empty,
+    full,
+    spacing,
+    array,
+    asarray,
+    broadcast_to,
+    flatnonzero,
+    ndarray,
+    argsort,
+    asfortranarray,
+    divide,
+    multiply,
+    nonzero,
+    minimum,
+    logical_or,
+    inf,
+    load,
+    einsum,
+)
+from numpy.lib.format import open_memmap
 from numpy.linalg import norm
-
-
-def maxent(A, b, lamb, w=None, x0=None) -> tuple:
+from scipy.sparse import csr_matrix
+
+from ._monitor import Monitor
+from .linop import as_operator
+
+# %% Set defaults.
+flat = 1e-3  # Measures a flat minimum.
+flatrange = 10  # How many iterations before a minimum is considered flat.
+maxit = 150  # Maximum number of CG iterations.
+minstep = 1e-12  # Determines the accuracy of x_lambda.
+sigma = 0.5  # Threshold used in descent test.
+tau0 = 1e-3  # Initial threshold used in secant root finder.
+
+# more right-hand sides than this are batched in the line search entropy term
+ENTROPY_LOOP_COLUMNS = 16
+
+
+def maxent(
+    A,
+    b,
+    lamb,
+    w=None,
+    x0=None,
+    *,
+    workers: int = 1,
+    continuation: bool = False,
+    full_output: bool = False,
+    history: int = 0,
+    history_dir: Path | None = None,
+    callback=None,
+) -> tuple:
     """
     MAXENT Maximum entropy regularization.
 
@@ -19,6 +75,11 @@ def maxent(A, b, lamb, w=None, x0=None) -> tuple:
      If lambda is a vector, then x_lambda is a matrix such that
         x_lambda = [x_lambda(1), x_lambda(2), ... ] .
 
+     If b is an m x k matrix, its k columns are solved together, each with its own
+     CG step lengths, so every product with A is a matrix-matrix product.
+     Then x_lambda is n x k x Nlambda, and rho, eta are k x Nlambda,
+     with the lambda axis dropped for scalar lambda.
+
      This routine uses a nonlinear conjugate gradient algorithm with "soft"
      line search and a step-length control that insures a positive solution.
      If the starting vector x0 is not specified, then the default is
@@ -27,19 +88,48 @@ def maxent(A, b, lamb, w=None, x0=None) -> tuple:
      Per Christian Hansen, IMM and Tommy Elfving, Dept. of Mathematics,
      Linkoping University, 06/10/92.
 
+     A may be a Numpy array, scipy.sparse matrix, airtools.Operator, or a matrix-free
+     scipy.sparse.linalg.LinearOperator with matvec and rmatvec, in which case
+     memory scales with the operator instead of m x n.
+
+     With workers > 1, the lambda values are solved in parallel by that many processes,
+     which read A from shared memory instead of receiving a copy per task.
+
+     With continuation=True, the lambda values are solved from largest to smallest,
+     each starting from the solution of the previous one, so a regularization path
+     costs a small multiple of a single solve. x0 starts the largest lambda.
+
+     With full_output=True, a fourth output "info" dict is returned with
+     "iterations": the number of CG iterations per lambda (k x Nlambda for m x k b).
+
+     The iteration history is not kept unless history > 0, so memory stays O(n) per lambda.
+     Then info["history"] is a list with a dict per lambda:
+        "x": n x k x nsaved iterates, every history-th CG iteration starting with the first
+        "objective", "step", "gradient": Niter x k values of
+            || A x - b ||^2 + lambda^2*x'*log(diag(w)*x), || delta x ||, || gradient ||
+     with the k axis dropped for vector b.
+     With history_dir, each "x" is a memory-mapped file history_dir/x_history_<j>.npy
+     for lambda index j instead of an in-memory array.
+
+     callback(info) is called after every CG iteration with a dict of "lambda", "iteration",
+     "residual" || A x - b ||, "objective" || A x - b ||^2 + lambda^2*x'*log(diag(w)*x)
+     and "time" per phase, only with workers=1.
+
      Reference: R. Fletcher, "Practical Methods for Optimization",
      Second Edition, Wiley, Chichester, 1987.
     """
-    A = atleast_2d(A)
-
-    if A.ndim != 2:
-        raise ValueError("A is expected to be a 2-D Numpy array")
+    A = as_operator(A)
 
     b = atleast_1d(b)
-    b = b.squeeze()
+    if b.ndim == 2 and b.shape[1] == 1:
+        b = b[:, 0]
+
+    if b.ndim > 2:
+        raise ValueError("b is expected to be a 1-D vector or 2-D matrix of column vectors")
 
-    if b.ndim > 1:
-        raise ValueError("b is expected to be a 1-D Numpy array")
+    vector = b.ndim == 1
+    # the CG iteration always works on m x k right-hand sides, k=1 for vector b
+    b = b.reshape(b.shape[0], -1)
 
     lamb = atleast_1d(lamb)
 
@@ -49,21 +139,13 @@ def maxent(A, b, lamb, w=None, x0=None) -> tuple:
     if (lamb < 0).any():
         raise ValueError("Regularization parameter lamb must be positive")
 
-    # %% Set defaults.
-    flat = 1e-3  # Measures a flat minimum.
-    flatrange = 10  # How many iterations before a minimum is considered flat.
-    maxit = 150  # Maximum number of CG iterations.
-    minstep = 1e-12  # Determines the accuracy of x_lambda.
-    sigma = 0.5  # Threshold used in descent test.
-    tau0 = 1e-3  # Initial threshold used in secant root finder.
-
     # %% Initialization.
     m, n = A.shape
+    k = b.shape[1]
     lamb = atleast_1d(lamb)
     Nlambda = lamb.size
 
-    x_lambda = zeros((n, Nlambda), order="F")
-    F = zeros(maxit)
+    x_lambda = zeros((n, k, Nlambda), order="F")
 
     if w is None:
         w = ones(n, dtype=float)  # needs to be column vector
@@ -71,131 +153,396 @@ def maxent(A, b, lamb, w=None, x0=None) -> tuple:
     if x0 is None:
         x0 = ones(n, dtype=float)  # needs to be column vector
 
-    rho = empty(Nlambda, dtype=float)
-    eta = empty(Nlambda, dtype=float)
+    w = asarray(w, dtype=float).reshape(n, 1)
+    x0 = broadcast_to(asarray(x0, dtype=float).reshape(n, -1), (n, k))
+
+    if history < 0:
+        raise ValueError("history must be a non-negative integer")
+    if history and not full_output:
+        raise ValueError("the history is returned in the info output, set full_output=True")
+
+    rho = empty((k, Nlambda), dtype=float)
+    eta = empty((k, Nlambda), dtype=float)
+
+    iterations = empty((k, Nlambda), dtype=int)
+
+    files: list = [None] * Nlambda
+    if history and history_dir is not None:
+        history_dir = Path(history_dir).expanduser()
+        history_dir.mkdir(parents=True, exist_ok=True)
+        files = [history_dir / f"x_history_{j}.npy" for j in range(Nlambda)]
 
     # Treat each lambda separately.
-    for j in range(Nlambda):
-        # Prepare for nonlinear CG iteration.
-        l2 = lamb[j] ** 2.0
+    if continuation:
+        if workers > 1:
+            raise ValueError("continuation solves the lambda values in sequence, use workers=1")
+        results: list = [None] * Nlambda
         x = x0
-        Ax = A.dot(x)
-        g = 2.0 * A.T.dot(Ax - b) + l2 * (1 + log(w * x))
-        p = -g
-        r = Ax - b
-
-        # Start the nonlinear CG iteration here.
-        delta_x = x
-        dF: float = 1.0
-        it = 0
-        phi0 = p.T.dot(g)
-        data = zeros((maxit, 3), dtype=float, order="F")
-        X = zeros((n, maxit), dtype=float, order="F")
-
-        while norm(delta_x, 2) > minstep * norm(x, 2) and dF > flat and it < maxit and phi0 < 0:
-            # Compute some CG quantities.
-            Ap = A.dot(p)
-            gamma = Ap.T.dot(Ap)
-            v = A.T.dot(Ap)
-
-            # Determine the steplength alpha by "soft" line search in which
-            # the minimum of phi(alpha) = p'*g(x + alpha*p) is determined to
-            # a certain "soft" tolerance.
-            # First compute initial parameters for the root finder.
-            alpha_left = 0
-            phi_left = phi0
-            if p.min() >= 0:
-                alpha_right = -phi0 / (2 * gamma)
-                h = 1.0 + alpha_right * p / x
-            else:
-                # Step-length control to insure a positive x + alpha*p.
-                i = p < 0
-                alpha_right = (-x[i] / p[i]).min()
-                h = 1.0 + alpha_right * p / x
-                delta = spacing(1)  # replacement for matlab eps
-                while h.min() <= 0:
-                    alpha_right = alpha_right * (1 - delta)
-                    h = 1 + alpha_right * p / x
-                    delta = delta * 2
-
-            z = log(h)
-            phi_right = phi0 + 2 * alpha_right * gamma + l2 * p.T.dot(z)
-            alpha = alpha_right
-            phi = phi_right
-
-            if phi_right <= 0:  # Special treatment of the case when phi(alpha_right) = 0.
-                z = log(1 + alpha * p / x)
-                g_new = g + l2 * z + 2 * alpha * v
-                t = g_new.T.dot(g_new)
-                beta = (t - g.T.dot(g_new)) / (phi - phi0)
-            else:
-                # The regular case: improve the steplength alpha iteratively
-                # until the new step is a descent step.
-                t = 1
-                u = 1
-                tau = tau0
-                uit = 0
-                while u > -sigma * t:
-                    uold = u
-                    # Use the secant method to improve the root of phi(alpha) = 0
-                    # to within an accuracy determined by tau.
-                    phiit = 0
-                    while abs(phi / phi0) > tau:
-                        phiold = phi
-                        alphaold = alpha
-                        alpha = (alpha_left * phi_right - alpha_right * phi_left) / (
-                            phi_right - phi_left
-                        )
-                        z = log(1 + alpha * p / x)
-                        phi = phi0 + 2 * alpha * gamma + l2 * p.T.dot(z)
-                        if phiold == phi and alphaold == alpha and phiit > maxit:
-                            warn(
-                                f"secant is not converging: abs(phi/phi0) = {abs(phi / phi0)}  "
-                                f"terminating phi search on iteration {phiit}"
-                            )
-                            break
-                        if phi > 0:
-                            alpha_right = alpha
-                            phi_right = phi
-                        else:
-                            alpha_left = alpha
-                            phi_left = phi
-                        phiit += 1
-                    # To check the descent step, compute u = p'*g_new and
-                    # t = norm(g_new)^2, where g_new is the gradient at x + alpha*p.
-                    g_new = g + l2 * z + 2 * alpha * v
-                    t = g_new.T.dot(g_new)
-                    beta = (t - g.T.dot(g_new)) / (phi - phi0)
-                    u = -t + beta * phi
-                    if u == uold and uit > maxit:
-                        warn(
-                            f"excessive descent iterations, terminating search on iteration {phiit}"
-                        )
-                        break
-                    tau = tau / 10.0
-                    uit += 1
-            # Update the iteration vectors.
-            g = g_new
-            delta_x = alpha * p
-            x = x + delta_x
-            p = -g + beta * p
-            r = r + alpha * Ap
-            phi0 = p.T.dot(g)
-
-            # Compute some norms and check for flat minimum.
-            rho[j] = norm(r)
-            eta[j] = x.T.dot(log(w * x))
-            F[it] = rho[j] ** 2 + l2 * eta[j]
-            if it <= flatrange:
-                dF = 1.0
-            else:
-                dF = abs(F[it] - F[it - flatrange]) / abs(F[it])
-
-            data[it, ...] = array([F[it], norm(delta_x), norm(g)])
-            X[..., it] = x
-
-            it += 1
-
-        x_lambda[..., j] = x
-
-    return x_lambda.squeeze(), rho, eta
+        for j in argsort(lamb, kind="stable")[::-1]:
+            results[j] = _maxent_cg(A, b, lamb[j] ** 2.0, w, x, history, files[j], callback)
+            x = results[j][0]
+    elif workers > 1 and Nlambda > 1:
+        if callback is not None:
+            raise ValueError("the callback is called in this process only, use workers=1")
+        results = _maxent_parallel(A, b, lamb**2.0, w, x0, workers, history, files)
+    else:
+        results = [
+            _maxent_cg(A, b, lamb[j] ** 2.0, w, x0, history, files[j], callback)
+            for j in range(Nlambda)
+        ]
+
+    for j in range(Nlambda):
+        x_lambda[..., j], rho[:, j], eta[:, j], iterations[:, j] = results[j][:4]
+
+    info: dict = {"iterations": iterations[0] if vector else iterations}
+    if history:
+        info["history"] = [_history(r[4], vector) for r in results]
+
+    if vector:
+        out = (x_lambda[:, 0, :].squeeze(), rho[0], eta[0])
+    elif Nlambda == 1:
+        out = (x_lambda[..., 0], rho[:, 0], eta[:, 0])
+    else:
+        out = (x_lambda, rho, eta)
+
+    return out + (info,) if full_output else out
+
+
+def _maxent_cg(
+    A, b, l2: float, w, x0, history: int = 0, file: Path | None = None, callback=None
+) -> tuple:
+    """
+    nonlinear CG solution of maxent for one lambda**2 = l2, all columns of b together.
+
+    Returns x, rho, eta, CG iterations of each column, and the history dict if history > 0
+    """
+    n, k = x0.shape
+    F = zeros((maxit, k))
+    rho = empty(k, dtype=float)
+    eta = empty(k, dtype=float)
+    iterations = zeros(k, dtype=int)
+
+    if history:
+        # the history only exists when asked for, it is O(n*maxit)
+        nsaved = -(-maxit // history)
+        if file is None:
+            X = zeros((n, k, nsaved), order="F")
+        else:
+            X = open_memmap(file, mode="w+", dtype=float, shape=(n, k, nsaved), fortran_order=True)
+        data = zeros((maxit, 3, k))
+
+    # Prepare for nonlinear CG iteration.
+    x = x0.copy()
+    Ax = A.dot(x)
+    g = 2.0 * A.T.dot(Ax - b) + l2 * (1 + log(w * x))
+    p = -g
+    r = Ax - b
+    rho[:] = norm(r, axis=0)
+    eta[:] = (x * log(w * x)).sum(axis=0)
+    # b is a vector when k == 1, maxent() drops a single column
+    monitor = None if callback is None else Monitor(callback, k == 1, **{"lambda": l2**0.5})
+
+    # Start the nonlinear CG iteration here.
+    # Each column of b has its own CG scalars, the columns still iterating are "c".
+    # step = || delta_x || of each column, zero for the columns that stopped.
+    step = norm(x, 2, axis=0)
+    dF = ones(k)
+    it = 0
+    phi0 = (p * g).sum(axis=0)
+
+    while True:
+        going = step > minstep * norm(x, 2, axis=0)
+        c = flatnonzero(going & (dF > flat) & (phi0 < 0))
+        if it >= maxit or c.size == 0:
+            break
+
+        xc = x[:, c]
+        pc = p[:, c]
+        gc = g[:, c]
+        phi0c = phi0[c]
+        # Compute some CG quantities.
+        if monitor:
+            monitor.lap("update")
+        Ap = A.dot(pc)
+        if monitor:
+            monitor.lap("projection")
+        gamma = (Ap * Ap).sum(axis=0)
+        v = A.T.dot(Ap)
+        if monitor:
+            monitor.lap("backprojection")
+
+        alpha, z, g_new, beta = _line_search(xc, pc, gc, v, phi0c, gamma, l2, sigma, tau0, maxit)
+
+        # Update the iteration vectors.
+        g[:, c] = g_new
+        step[:] = 0
+        step[c] = abs(alpha) * norm(pc, 2, axis=0)
+        x[:, c] = xc + alpha * pc
+        p[:, c] = -g_new + beta * pc
+        r[:, c] += alpha * Ap
+        phi0[c] = (p[:, c] * g_new).sum(axis=0)
+
+        # Compute some norms and check for flat minimum.
+        rho[c] = norm(r[:, c], axis=0)
+        eta[c] = (x[:, c] * log(w * x[:, c])).sum(axis=0)
+        F[it, c] = rho[c] ** 2 + l2 * eta[c]
+        if it <= flatrange:
+            dF[c] = 1.0
+        else:
+            dF[c] = abs(F[it, c] - F[it - flatrange, c]) / abs(F[it, c])
+
+        if history:
+            data[it, :, c] = array([F[it, c], step[c], norm(g_new, axis=0)]).T
+            if it % history == 0:
+                X[..., it // history] = x
+
+        if monitor:
+            monitor.report(it, rho, rho**2 + l2 * eta)
+
+        it += 1
+        iterations[c] += 1
+
+    if not history:
+        return x, rho, eta, iterations
+
+    nsaved = -(-it // history)
+    if file is None:
+        saved: ndarray | tuple = X[..., :nsaved].copy(order="F")
+    else:
+        # the file is mapped again by the caller, which may be another process
+        X.flush()  # type: ignore[attr-defined]
+        saved = (file, nsaved)
+
+    trace = {"x": saved, "objective": data[:it, 0], "step": data[:it, 1], "gradient": data[:it, 2]}
+
+    return x, rho, eta, iterations, trace
+
+
+def _history(trace: dict, vector: bool) -> dict:
+    """
+    map the iterates written to a file, and drop the k axis for vector b
+    """
+    if isinstance(trace["x"], tuple):
+        file, nsaved = trace["x"]
+        trace["x"] = load(file, mmap_mode="r")[..., :nsaved]
+
+    if vector:
+        trace = {key: v[..., 0, :] if key == "x" else v[:, 0] for key, v in trace.items()}
+
+    return trace
+
+
+def _maxent_parallel(A, b, l2, w, x0, workers: int, history: int, files: list) -> list:
+    """
+    solve each lambda**2 of l2 in a process pool. The arrays of A are placed in shared memory
+    once and mapped by each worker, instead of being pickled with every task.
+    """
+    if A.streaming or A.matrix_free:
+        raise ValueError("parallel maxent needs the elements of A in memory")
+
+    if A.issparse:
+        arrays = [A.A.data, A.A.indices, A.A.indptr]
+    else:
+        arrays = [A.A]
+
+    blocks = []
+    try:
+        specs = []
+        for a in arrays:
+            shm = SharedMemory(create=True, size=max(a.nbytes, 1))
+            blocks.append(shm)
+            ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+            specs.append((shm.name, a.shape, a.dtype.str))
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_worker_init,
+            initargs=(specs, A.issparse, A.shape, b, w, x0, history),
+        ) as pool:
+            return list(pool.map(_worker_solve, l2, files))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+_worker: dict = {}
+
+
+def _worker_init(specs: list, issparse: bool, shape: tuple, b, w, x0, history: int) -> None:
+    """
+    map the shared arrays of A in a worker process
+    """
+    blocks = [SharedMemory(name=name) for name, _, _ in specs]
+    arrays = [ndarray(s[1], s[2], buffer=shm.buf) for s, shm in zip(specs, blocks)]
+
+    if issparse:
+        A = csr_matrix(tuple(arrays), shape=shape, copy=False)
+    else:
+        A = arrays[0]
+
+    # the blocks must stay referenced while A uses their buffers
+    _worker.update(A=A, blocks=blocks, b=b, w=w, x0=x0, history=history)
+
+
+def _worker_solve(l2: float, file: Path | None) -> tuple:
+    return _maxent_cg(
+        _worker["A"], _worker["b"], l2, _worker["w"], _worker["x0"], _worker["history"], file
+    )
+
+
+def _line_search(x, p, g, v, phi0, gamma, l2: float, sigma: float, tau0: float, maxit: int) -> tuple:
+    """
+    Determine the steplength alpha by "soft" line search in which
+    the minimum of phi(alpha) = p'*g(x + alpha*p) is determined to
+    a certain "soft" tolerance.
+    The n x k arrays hold one search per column, each with its own scalars of length k.
+
+    Returns
+    -------
+    alpha, z = log(1 + alpha*p/x), g_new = gradient at x + alpha*p, beta
+    """
+    n, k = x.shape
+    # phi(alpha) = phi0 + 2*alpha*gamma + l2 * p'*log(1 + alpha*p/x) only involves the
+    # entries with p != 0, through q = p/x computed once for all trial steps.
+    # Column-major, so each trial evaluates the columns in place without gathering them.
+    nz = flatnonzero((p != 0).any(axis=1))
+    rows = slice(None) if nz.size == n else nz
+    xr = x[rows]
+    pr = asfortranarray(p[rows])
+    q = empty(pr.shape, order="F")
+    divide(pr, xr, out=q)
+    zr = empty(pr.shape, order="F")
+
+    # First compute initial parameters for the root finder.
+    alpha_left = zeros(k)
+    phi_left = phi0.copy()
+
+    alpha_right = -phi0 / (2 * gamma)
+    qmin = q.min(axis=0, initial=0.0)
+    neg = flatnonzero(qmin < 0)
+    if neg.size:
+        # Step-length control to insure a positive x + alpha*p.
+        alpha_right[neg] = _positive_step(xr[:, neg], pr[:, neg], q[:, neg], qmin[neg])
+
+    phi_right = phi0 + 2 * alpha_right * gamma + l2 * _entropy_term(alpha_right, q, pr, zr, range(k))
+    alpha = alpha_right.copy()
+    phi = phi_right.copy()
+
+    # Special treatment of the case when phi(alpha_right) = 0: z, phi are already at alpha_right.
+    # The regular case: improve the steplength alpha iteratively
+    # until the new step is a descent step.
+    u = ones(k)
+    tau = full(k, tau0)
+    uit = 0
+    if nz.size == n:
+        z = zr
+    else:
+        z = zeros((n, k), order="F")
+        z[rows] = zr
+    g_new = g + l2 * z + 2 * alpha * v
+    t = (g_new * g_new).sum(axis=0)
+    beta = (t - (g * g_new).sum(axis=0)) / (phi - phi0)
+
+    descend = phi_right > 0
+    while descend.any():
+        uold = u.copy()
+        # Use the secant method to improve the root of phi(alpha) = 0
+        # to within an accuracy determined by tau.
+        phiit = 0
+        secant = descend & (abs(phi / phi0) > tau)
+        while secant.any():
+            s = secant
+            phiold = phi[s]
+            alphaold = alpha[s]
+            alpha[s] = (alpha_left[s] * phi_right[s] - alpha_right[s] * phi_left[s]) / (
+                phi_right[s] - phi_left[s]
+            )
+            pz = _entropy_term(alpha, q, pr, zr, flatnonzero(s))
+            phi[s] = phi0[s] + 2 * alpha[s] * gamma[s] + l2 * pz
+            stuck = (phiold == phi[s]) & (alphaold == alpha[s]) & (phiit > maxit)
+            if stuck.any():
+                warn(
+                    f"secant is not converging: abs(phi/phi0) = {abs(phi[s][stuck] / phi0[s][stuck])}  "
+                    f"terminating phi search on iteration {phiit}"
+                )
+            move = s.copy()
+            move[s] = ~stuck
+            right = move & (phi > 0)
+            left = move & ~(phi > 0)
+            alpha_right[right] = alpha[right]
+            phi_right[right] = phi[right]
+            alpha_left[left] = alpha[left]
+            phi_left[left] = phi[left]
+            phiit += 1
+            secant = move & (abs(phi / phi0) > tau)
+        # To check the descent step, compute u = p'*g_new and
+        # t = norm(g_new)^2, where g_new is the gradient at x + alpha*p.
+        d = descend
+        if z is not zr:
+            z[rows] = zr
+        g_new[:, d] = g[:, d] + l2 * z[:, d] + 2 * alpha[d] * v[:, d]
+        t[d] = (g_new[:, d] * g_new[:, d]).sum(axis=0)
+        beta[d] = (t[d] - (g[:, d] * g_new[:, d]).sum(axis=0)) / (phi[d] - phi0[d])
+        u[d] = -t[d] + beta[d] * phi[d]
+        stuck = d & (u == uold) & (uit > maxit)
+        if stuck.any():
+            warn(f"excessive descent iterations, terminating search on iteration {phiit}")
+        tau[d] = tau[d] / 10.0
+        uit += 1
+        descend = d & ~stuck & (u > -sigma * t)
+
+    return alpha, z, g_new, beta
+
+
+def _entropy_term(alpha, q, p, z, cols) -> ndarray:
+    """
+    z[:, j] = log1p(alpha[j]*q[:, j]) in place and p[:, j]'*z[:, j] for each column j in cols.
+    A few columns are computed one at a time without temporaries, many at once.
+    """
+    if len(cols) > ENTROPY_LOOP_COLUMNS:
+        cols = asarray(cols)
+        if cols.size == z.shape[1]:
+            multiply(q, alpha, out=z)
+            log1p(z, out=z)
+            return einsum("ij,ij->j", p, z)
+
+        zc = q[:, cols] * alpha[cols]
+        log1p(zc, out=zc)
+        z[:, cols] = zc
+        return einsum("ij,ij->j", p[:, cols], zc)
+
+    pz = empty(len(cols))
+    for i, j in enumerate(cols):
+        zj = z[:, j]
+        multiply(q[:, j], alpha[j], out=zj)
+        log1p(zj, out=zj)
+        pz[i] = p[:, j] @ zj
+
+    return pz
+
+
+def _positive_step(x, p, q, qmin) -> ndarray:
+    """
+    largest alpha = min(-x/p) of each column, shrunk until x + alpha*p > 0 and
+    alpha*q > -1 for q = p/x also in floating point, so log1p(alpha*q) is finite.
+    Only the entries with q within roundoff of min(q) can reach the bound,
+    so the bound and the shrinking are computed on these few entries.
+    """
+    i, j = nonzero(q <= qmin * (1 - 16 * spacing(1)))
+    x = x[i, j]
+    p = p[i, j]
+    q = q[i, j]
+
+    alpha = full(qmin.size, inf)
+    minimum.at(alpha, j, -x / p)
+
+    delta = full(qmin.size, spacing(1))  # replacement for matlab eps
+    shrink = zeros(qmin.size, dtype=bool)
+    while True:
+        shrink[:] = False
+        logical_or.at(shrink, j, (x + alpha[j] * p <= 0) | (alpha[j] * q <= -1))
+        if not shrink.any():
+            return alpha
+        alpha[shrink] *= 1 - delta[shrink]
+        delta[shrink] *= 2
@@ -31,7 +31,7 @@ PICARD Visual inspection of the Picard condition.
 def picard(U, s, b, d=0) -> tuple:
     n, ps = np.atleast_2d(s).T.shape
 
-    beta = np.abs(np.asfortranarray(U[:, :n]).T.dot(b))
+    beta = np.abs(U[:, :n].T @ b)
     eta = np.zeros(n, order="F")
 
     if ps == 2:
@@ -43,9 +43,18 @@ def picard(U, s, b, d=0) -> tuple:
     if (s == 0).any():  # 10**-14 is OK?
         logging.warning("** picard: Division by zero: singular values")
 
-    for i in keta:
-        es = np.s_[i - d : i + d + 1]
-        eta[i] = (beta[es].prod() ** (1 / d21)) / s[i]
+    # geometric mean over the 2*d+1 window as a moving average of log(beta):
+    # O(n) via a cumulative sum, and no underflow of the product for long windows.
+    # Windows containing a zero coefficient have mean 0.
+    logb = np.log(beta, out=np.zeros(beta.shape), where=beta > 0).reshape(n, -1).sum(axis=1)
+    zero = (beta == 0).reshape(n, -1).any(axis=1)
+
+    csum = np.concatenate(([0.0], np.cumsum(logb)))
+    czero = np.concatenate(([0], np.cumsum(zero)))
+
+    mean = np.exp((csum[keta + d + 1] - csum[keta - d]) / d21)
+    mean[czero[keta + d + 1] > czero[keta - d]] = 0
+    eta[keta] = mean / s[keta]
 
     return eta, n, s, beta, keta, ps
 
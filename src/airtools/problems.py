@@ -0,0 +1,249 @@
+"""
+Tomography test problems, after paralleltomo, fanbeamtomo and phantomgallery of AIRtools II.
+
+The image is N x N pixels of unit size covering [-N/2, N/2]^2, and pixel (r, c)
+of x.reshape(N, N) is row r from the top and column c from the left,
+i.e. column r * N + c of A. Rows of A are sorted by angle, then by ray.
+
+>>> A = paralleltomo(256)
+>>> x = shepplogan(256).ravel()
+>>> b, e = add_noise(A @ x, 0.01, seed=0)
+>>> x_hat = kaczmarz(A, b, stop_mdp=True, taudelta=np.linalg.norm(e))[0]
+
+P. C. Hansen and J. S. Jorgensen, "AIR Tools II: algebraic iterative reconstruction
+methods, improved implementation", Numerical Algorithms 79, 2018.
+R. L. Siddon, "Fast calculation of the exact radiological path for a three-dimensional
+CT array", Medical Physics 12, 1985.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import scipy.sparse as sp
+
+# number of ray-grid line intersections handled at once, bounds the temporary memory
+CHUNK_INTERSECTIONS = 2**22
+
+
+def paralleltomo(N: int, theta=None, p: int | None = None, d: float | None = None) -> sp.csr_matrix:
+    """
+    parallel-beam tomography system matrix
+
+    Parameters
+    ----------
+    N: int
+        the image is N x N pixels
+    theta: array_like
+        projection angles in degrees, default 0, 1, ..., 179
+    p: int
+        number of parallel rays per angle, default round(sqrt(2) * N)
+    d: float
+        distance from the first to the last ray, default p - 1
+
+    Results
+    -------
+    A: scipy.sparse.csr_matrix
+        len(theta) * p x N**2 matrix of the length of each ray in each pixel
+    """
+    theta = np.radians(np.arange(180) if theta is None else np.atleast_1d(theta))
+    if p is None:
+        p = int(round(np.sqrt(2) * N))
+    if d is None:
+        d = p - 1
+
+    # for angle theta, the rays travel along (cos theta, sin theta),
+    # offset by t along the detector direction (-sin theta, cos theta)
+    t = np.linspace(-d / 2, d / 2, p)
+    cx = np.repeat(np.cos(theta), p)
+    cy = np.repeat(np.sin(theta), p)
+    tt = np.tile(t, theta.size)
+
+    return _siddon(-tt * cy, tt * cx, cx, cy, N)
+
+
+def fanbeamtomo(
+    N: int,
+    theta=None,
+    p: int | None = None,
+    R: float = 2,
+    dw: float | None = None,
+    sd: float = 3,
+) -> sp.csr_matrix:
+    """
+    fan-beam tomography system matrix, with a flat detector
+
+    Parameters
+    ----------
+    N: int
+        the image is N x N pixels
+    theta: array_like
+        source angles in degrees, default 0, 1, ..., 359
+    p: int
+        number of rays (detector elements) per angle, default round(sqrt(2) * N)
+    R: float
+        distance from the source to the center of the image, in units of N
+    dw: float
+        width of the detector, default 2.5 * N, which covers the image at the default R, sd
+    sd: float
+        distance from the source to the detector, in units of N
+
+    Results
+    -------
+    A: scipy.sparse.csr_matrix
+        len(theta) * p x N**2 matrix of the length of each ray in each pixel
+    """
+    theta = np.radians(np.arange(360) if theta is None else np.atleast_1d(theta))
+    if p is None:
+        p = int(round(np.sqrt(2) * N))
+    if dw is None:
+        dw = 2.5 * N
+
+    # source at R * N along (cos theta, sin theta), detector sd * N away on the other side
+    t = np.tile(np.linspace(-dw / 2, dw / 2, p), theta.size)
+    c = np.repeat(np.cos(theta), p)
+    s = np.repeat(np.sin(theta), p)
+    x0 = R * N * c
+    y0 = R * N * s
+    dx = -sd * N * c - t * s
+    dy = -sd * N * s + t * c
+    length = np.hypot(dx, dy)
+
+    return _siddon(x0, y0, dx / length, dy / length, N)
+
+
+def _siddon(x0, y0, cx, cy, N: int) -> sp.csr_matrix:
+    """
+    lengths of the lines x0 + s * cx, y0 + s * cy (|(cx, cy)| = 1) through the pixels of the grid,
+    for many rays at once.
+
+    The parameters s where each ray crosses the N + 1 vertical and N + 1 horizontal grid lines
+    are sorted per ray, so consecutive values between the entry into and the exit from the image
+    bound the segment of the ray in one pixel, which is found from the segment midpoint.
+    """
+    grid = np.arange(N + 1) - N / 2
+    index_dtype = np.int32 if N**2 <= np.iinfo(np.int32).max else np.int64
+    rows = max(1, CHUNK_INTERSECTIONS // (2 * N + 2))
+
+    blocks = []
+    for start in range(0, x0.size, rows):
+        i = slice(start, start + rows)
+        x, y, u, v = x0[i], y0[i], cx[i], cy[i]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # rays parallel to grid lines give +-inf or NaN, which sort outside [enter, exit]
+            s = np.concatenate([(grid - x[:, None]) / u[:, None], (grid - y[:, None]) / v[:, None]], axis=1)
+            s.sort(axis=1)
+
+            enter_x, exit_x = _slab(x, u, N / 2)
+            enter_y, exit_y = _slab(y, v, N / 2)
+            enter = np.maximum(enter_x, enter_y)[:, None]
+            leave = np.minimum(exit_x, exit_y)[:, None]
+
+            # zero-length segments are rays through grid points
+            ds = s[:, 1:] - s[:, :-1]
+            segment = np.flatnonzero((s[:, :-1] >= enter) & (s[:, 1:] <= leave) & (ds > 1e-10))
+
+        ray, k = np.divmod(segment, ds.shape[1])
+        ds = ds.ravel()[segment]
+        mid = s[ray, k] + ds / 2
+        col = np.floor(x[ray] + mid * u[ray] + N / 2)
+        row = np.floor(N / 2 - (y[ray] + mid * v[ray]))
+        # a ray along the bottom or right edge of the image is outside the half-open pixels
+        inside = (col < N) & (row < N)
+
+        indptr = np.zeros(s.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ray[inside], minlength=s.shape[0]), out=indptr[1:])
+        block = sp.csr_matrix(
+            (ds[inside], (row[inside] * N + col[inside]).astype(index_dtype), indptr),
+            shape=(s.shape[0], N**2),
+        )
+        # rays visit the pixels in path order, and roundoff at grid points may split a pixel
+        block.sum_duplicates()
+        blocks.append(block)
+
+    return sp.vstack(blocks, format="csr")
+
+
+def _slab(o, c, h: float) -> tuple:
+    """
+    parameters where the lines o + s * c enter and exit the slab [-h, h]
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s1 = (-h - o) / c
+        s2 = (h - o) / c
+    enter = np.minimum(s1, s2)
+    leave = np.maximum(s1, s2)
+
+    parallel = c == 0
+    within = np.abs(o[parallel]) <= h
+    enter[parallel] = np.where(within, -np.inf, np.inf)
+    leave[parallel] = np.where(within, np.inf, -np.inf)
+
+    return enter, leave
+
+
+def shepplogan(N: int) -> np.ndarray:
+    """
+    N x N modified Shepp-Logan phantom of Toft, values in [0, 1]
+    """
+    # intensity, semi-axes, center, rotation in degrees
+    ellipses = [
+        (1.0, 0.69, 0.92, 0.0, 0.0, 0),
+        (-0.8, 0.6624, 0.874, 0.0, -0.0184, 0),
+        (-0.2, 0.11, 0.31, 0.22, 0.0, -18),
+        (-0.2, 0.16, 0.41, -0.22, 0.0, 18),
+        (0.1, 0.21, 0.25, 0.0, 0.35, 0),
+        (0.1, 0.046, 0.046, 0.0, 0.1, 0),
+        (0.1, 0.046, 0.046, 0.0, -0.1, 0),
+        (0.1, 0.046, 0.023, -0.08, -0.605, 0),
+        (0.1, 0.023, 0.023, 0.0, -0.606, 0),
+        (0.1, 0.023, 0.046, 0.06, -0.605, 0),
+    ]
+
+    x, y = _pixel_centers(N)
+    im = np.zeros((N, N))
+    for value, a, b, xc, yc, phi in ellipses:
+        c, s = np.cos(np.radians(phi)), np.sin(np.radians(phi))
+        u = (x - xc) * c + (y - yc) * s
+        v = (y - yc) * c - (x - xc) * s
+        im[(u / a) ** 2 + (v / b) ** 2 <= 1] += value
+
+    return np.clip(im, 0, None)
+
+
+def smooth(N: int) -> np.ndarray:
+    """
+    N x N smooth phantom, sum of four Gaussians, values in (0, 1]
+    """
+    x, y = _pixel_centers(N)
+    im = np.zeros((N, N))
+    for value, xc, yc in [(1.0, 0.2, -0.2), (0.5, 0.0, 0.4), (0.7, -0.6, -0.4), (0.9, 0.6, 0.6)]:
+        im += value * np.exp(-((x - xc) ** 2 + (y - yc) ** 2) / 0.8**2)
+
+    return im / im.max()
+
+
+def _pixel_centers(N: int) -> tuple:
+    """
+    x, y coordinates in [-1, 1] of the pixel centers, y increasing upwards
+    """
+    c = (np.arange(N) + 0.5) / N * 2 - 1
+    return c[None, :], -c[:, None]
+
+
+def add_noise(b, rel_noise: float, seed=None) -> tuple:
+    """
+    add Gaussian white noise e with ||e|| = rel_noise * ||b||
+
+    Results
+    -------
+    b: numpy.ndarray
+        noisy data b + e
+    e: numpy.ndarray
+        the noise, ||e|| is the taudelta of the discrepancy principle
+    """
+    b = np.asarray(b, dtype=float)
+    e = np.random.default_rng(seed).standard_normal(b.shape)
+    e *= rel_noise * np.linalg.norm(b) / np.linalg.norm(e)
+
+    return b + e, e
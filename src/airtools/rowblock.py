@@ -0,0 +1,128 @@
+from __future__ import annotations
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+COMPONENTS = ("indptr", "indices", "data", "shape")
+
+
+class RowBlockMatrix:
+    """
+    M x N CSR matrix whose indptr / indices / data arrays stay on disk.
+
+    The arrays are memory-mapped .npy files, and the matrix is only ever
+    materialized one block of rows at a time, so a matrix larger than RAM
+    can be used by the solvers. Wrap it in airtools.Operator
+    (done automatically by the solvers) to cache row norms etc.
+
+    >>> RowBlockMatrix.save("A_dir", A)  # once, from a scipy.sparse matrix
+    >>> A = RowBlockMatrix.load("A_dir", block_rows=100_000)
+    >>> x = kaczmarz(A, b)[0]
+    """
+
+    def __init__(self, indptr, indices, data, shape: tuple[int, int], block_rows: int = 65536):
+        if block_rows < 1:
+            raise ValueError("block_rows must be a positive integer")
+        if len(indptr) != shape[0] + 1:
+            raise ValueError("indptr must have M+1 elements")
+
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape: tuple[int, int] = (int(shape[0]), int(shape[1]))
+        self.ndim = 2
+        self.dtype = data.dtype
+        self.block_rows = block_rows
+
+    @classmethod
+    def load(cls, path: Path, block_rows: int = 65536) -> RowBlockMatrix:
+        """
+        memory-map the indptr.npy, indices.npy, data.npy and shape.npy files in directory "path"
+        """
+        path = Path(path).expanduser()
+        arrays = {k: np.load(path / f"{k}.npy", mmap_mode="r") for k in COMPONENTS}
+
+        return cls(
+            arrays["indptr"], arrays["indices"], arrays["data"], tuple(arrays["shape"]), block_rows
+        )
+
+    @staticmethod
+    def save(path: Path, A) -> None:
+        """
+        write sparse matrix A as the .npy files read by RowBlockMatrix.load()
+        """
+        path = Path(path).expanduser()
+        path.mkdir(parents=True, exist_ok=True)
+
+        A = sp.csr_matrix(A)
+        A.sum_duplicates()
+        np.save(path / "indptr.npy", A.indptr)
+        np.save(path / "indices.npy", A.indices)
+        np.save(path / "data.npy", A.data)
+        np.save(path / "shape.npy", np.array(A.shape))
+
+    def __repr__(self) -> str:
+        return f"RowBlockMatrix({self.shape[0]} x {self.shape[1]}, {self.block_rows} rows per block)"
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """
+        first row of each block, and M
+        """
+        return np.append(np.arange(0, self.shape[0], self.block_rows), self.shape[0])
+
+    def block(self, k: int) -> sp.csr_matrix:
+        """
+        read block k of rows into memory as CSR
+        """
+        r0, r1 = self.bounds[k : k + 2]
+        p0, p1 = self.indptr[r0], self.indptr[r1]
+
+        return sp.csr_matrix(
+            (
+                np.array(self.data[p0:p1]),
+                np.array(self.indices[p0:p1]),
+                np.array(self.indptr[r0 : r1 + 1]) - p0,
+            ),
+            shape=(r1 - r0, self.shape[1]),
+        )
+
+    def row_blocks(self):
+        """
+        yield first row, end row, CSR block of rows
+        """
+        bounds = self.bounds
+        for k in range(bounds.size - 1):
+            yield bounds[k], bounds[k + 1], self.block(k)
+
+    def __matmul__(self, x):
+        y = np.empty((self.shape[0],) + x.shape[1:], dtype=np.result_type(self.dtype, x))
+        for r0, r1, Ab in self.row_blocks():
+            y[r0:r1] = Ab @ x
+        return y
+
+    dot = __matmul__
+
+    @property
+    def T(self) -> _TransposedRowBlockMatrix:
+        return _TransposedRowBlockMatrix(self)
+
+
+class _TransposedRowBlockMatrix:
+    """
+    back projection A.T @ y accumulated block by block
+    """
+
+    def __init__(self, A: RowBlockMatrix):
+        self.A = A
+        self.shape = A.shape[::-1]
+        self.ndim = 2
+
+    def __matmul__(self, y):
+        x = np.zeros((self.shape[0],) + y.shape[1:], dtype=np.result_type(self.A.dtype, y))
+        for r0, r1, Ab in self.A.row_blocks():
+            x += Ab.T @ y[r0:r1]
+        return x
+
+    dot = __matmul__
@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+import numpy as np
 
-def rzr(A, b=None, Nthr: int = 0) -> tuple:
+from .linop import Operator, _nnz, as_operator
+
+
+def rzr(A, b=None, Nthr: int = 0, Mthr: int | None = None) -> tuple:
     """
     rzr  Remove zero rows of A and the corresponding elements of b.
 
-    Assumes A,b are Numpy arrays
+    A may be a Numpy array, scipy.sparse matrix or airtools.Operator,
+    whose cached nonzero counts are reused. b is a Numpy array.
+    The nonzero elements are counted without forming a boolean copy of A,
+    so negative elements count as well.
 
-     A,b = rzr(A,b)
-     A,b = rzr(A,b,Nthr)
+     A,b,goodInd = rzr(A,b)
+     A,b,goodInd = rzr(A,b,Nthr)
+     A,b,goodInd,goodCols = rzr(A,b,Nthr,Mthr)
 
      Identifies zero rows of the coefficient matrix A and removes them.
      If a right-hand side b is present, the corresponding elements of
@@ -17,6 +25,15 @@ def rzr(A, b=None, Nthr: int = 0) -> tuple:
      If a positive Nthr is given as the third argument, then all rows with
      less than or equal to Nthr nonzero elements are removed.
 
+     If Mthr is given, then also all columns with less than or equal to Mthr
+     nonzero elements in the remaining rows are removed, e.g. Mthr=0 for the
+     pixels no ray passes through. The unknowns of these columns are not
+     determined by b, and every solver works on the smaller problem.
+     The solution is scattered back to the full grid by expand(x, goodCols).
+
+     goodInd and goodCols are boolean masks of the kept rows and columns.
+     If nothing is removed, A itself is returned, not a copy.
+
      Use this function to 'clean up' a discretized tomography problem.
      Zero rows do not contribute to the reconstruction.
      Rows with few nonzero elements correspond to pixels near the corners of
@@ -26,12 +43,55 @@ def rzr(A, b=None, Nthr: int = 0) -> tuple:
      ported to Python by Michael Hirsch
     """
 
-    s = (A > 0).sum(axis=1)  # number of non-zero elements per row
+    op = as_operator(A)
+    s = op.row_nnz  # number of non-zero elements per row
     goodInd = s > Nthr
-    # ngood = goodInd.sum()
-    A = A[goodInd, :]
+    allRows = goodInd.all()
+    Ar = op.A if allRows else op.A[goodInd, :]
 
     if b is not None:
         b = b[goodInd]
 
-    return A, b, goodInd
+    if Mthr is None:
+        return _like(A, Ar), b, goodInd
+
+    # nonzeros per column of the kept rows, cached by the Operator if no row was removed
+    goodCols = (op.col_nnz if allRows else _nnz(Ar, axis=0)) > Mthr
+    if not goodCols.all():
+        Ar = Ar[:, goodCols]
+
+    return _like(A, Ar), b, goodInd, goodCols
+
+
+def expand(x, goodCols, fill: float = 0.0):
+    """
+    scatter the solution x of the problem reduced by rzr back to the full grid
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        solution for the kept columns, vector or one column per right-hand side
+    goodCols: numpy.ndarray
+        boolean mask of the kept columns returned by rzr
+    fill: float
+        value of the removed unknowns
+
+    Results
+    -------
+    x: numpy.ndarray
+        goodCols.size (x k) solution
+    """
+    x = np.asarray(x)
+    full = np.full((goodCols.size,) + x.shape[1:], fill, dtype=np.result_type(x, fill))
+    full[goodCols] = x
+
+    return full
+
+
+def _like(A, Ar):
+    """
+    the reduced matrix Ar, as an Operator if A was one
+    """
+    if isinstance(A, Operator):
+        return A if Ar is A.A else Operator(Ar)
+    return Ar
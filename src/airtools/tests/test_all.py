@@ -13,6 +13,7 @@ from pytest import approx
 from numpy.linalg import svd
 import numpy as np
 from scipy import sparse
+from scipy.sparse.linalg import LinearOperator
 
 import airtools
 
@@ -28,12 +29,117 @@ def test_kaczmarz(matrices, name):
     assert x_est == approx(x, rel=0.01)
 
 
+@pytest.mark.parametrize("block_size", [2, 4])
+@pytest.mark.parametrize("name", used)
+def test_kaczmarz_block(matrices, name, block_size):
+    A = matrices
+    for iA in [A, sparse.csr_matrix(A)]:
+        x_est = airtools.kaczmarz(iA, A @ x, max_iter=1000, lamb=1.5, block_size=block_size)[0]
+        assert x_est == approx(x, rel=0.01)
+
+
+def test_kaczmarz_block_convergence():
+    from airtools.problems import paralleltomo, shepplogan
+
+    A = paralleltomo(32, np.arange(0, 180, 3), p=45)
+    b = A @ shepplogan(32).ravel()
+
+    def relres(block_size: int, order: str = "cyclic") -> float:
+        x_est = airtools.kaczmarz(A, b, max_iter=10, block_size=block_size, order=order)[0]
+        return float(np.linalg.norm(b - A @ x_est) / np.linalg.norm(b))
+
+    # the parallel rays of one angle share few pixels, so a block of them
+    # progresses per sweep about as much as the rows one at a time
+    assert relres(45) < 1.25 * relres(1)
+    assert relres(4 * 45) < 0.05
+    # multilevel orders the blocks of one angle each, far apart in angle
+    assert relres(45, "multilevel") < 0.75 * relres(45)
+
+
+def test_kaczmarz_multilevel_blocks():
+    from airtools.kaczmarz import _chunk_rows, _sweep_order
+
+    op = airtools.Operator(np.ones((10, 2)))
+    items = _chunk_rows(op, op.row_norm_sq, op.nonzero_rows, 2)[0][2]
+    # blocks of consecutive rows, visited in bit-reversal order
+    assert [r.tolist() for r in items] == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+    assert _sweep_order("multilevel", len(items), None, None).tolist() == [0, 4, 2, 1, 3]
+
+
+@pytest.mark.parametrize("order", ["shuffle", "random", "multilevel"])
+@pytest.mark.parametrize("name", used)
+def test_kaczmarz_order(matrices, name, order):
+    A = matrices
+    x_est = airtools.kaczmarz(A, A @ x, max_iter=500, order=order, seed=1)[0]
+    assert x_est == approx(x, rel=0.01)
+    assert airtools.kaczmarz(A, A @ x, max_iter=5, order=order, seed=1)[0] == approx(
+        airtools.kaczmarz(A, A @ x, max_iter=5, order=order, seed=1)[0], rel=0, abs=0
+    )
+
+
+def test_kaczmarz_kernel():
+    from airtools._kernels import (
+        _kaczmarz_sweep_dense_loop,
+        _kaczmarz_sweep_dense_numpy,
+        _kaczmarz_sweep_loop,
+        _kaczmarz_sweep_numpy,
+    )
+
+    A = sparse.random(30, 20, density=0.2, format="csr", random_state=0)
+    b = A @ np.linspace(1, 2, 60).reshape(20, 3)
+    RowNormSq = np.asarray(A.multiply(A).sum(axis=1)).squeeze()
+    rows = np.flatnonzero(RowNormSq)
+
+    x_loop = np.zeros((20, 3))
+    x_numpy = np.zeros((20, 3))
+    args = (rows, RowNormSq, 1.0, True)
+    for _ in range(5):
+        _kaczmarz_sweep_loop(A.indptr, A.indices, A.data, b, x_loop, *args, np.zeros(3))
+        _kaczmarz_sweep_numpy(A.indptr, A.indices, A.data, b, x_numpy, *args, np.zeros(3))
+    assert x_numpy == approx(x_loop, rel=1e-12)
+
+    # dense A, swept without a CSR copy
+    for sweep in (_kaczmarz_sweep_dense_loop, _kaczmarz_sweep_dense_numpy):
+        x_dense = np.zeros((20, 3))
+        for _ in range(5):
+            sweep(A.toarray(), b, x_dense, *args, np.zeros(3))
+        assert x_dense == approx(x_loop, rel=1e-12)
+
+    # the residual of the sweep start in the last columns, computed during the sweep
+    x_next = x_loop.copy()
+    _kaczmarz_sweep_loop(A.indptr, A.indices, A.data, b, x_next, *args, np.zeros(3))
+    for sweep in (_kaczmarz_sweep_loop, _kaczmarz_sweep_numpy):
+        X = np.hstack((x_loop, x_loop))
+        res2 = np.zeros(3)
+        sweep(A.indptr, A.indices, A.data, b, X, *args, res2)
+        assert res2 == approx(((b - A @ x_loop)[rows] ** 2).sum(axis=0), rel=1e-12)
+        assert X[:, :3] == approx(x_next, rel=1e-12)
+        assert np.array_equal(X[:, 3:], x_loop)
+
+
 @pytest.mark.parametrize("name", used)
 def test_logmart(matrices, name):
     A = matrices
     x_est = airtools.logmart(A, A @ x, relax=5, max_iter=2000)[0]
     assert x_est == approx(x, rel=0.01)
 
+    x_sparse = airtools.logmart(sparse.csr_matrix(A), A @ x, relax=5, max_iter=2000)[0]
+    assert x_sparse == approx(x_est)
+
+
+@pytest.mark.parametrize("name", used)
+def test_logmart_fortran(matrices, name):
+    from airtools import _fortran
+
+    if not _fortran.available():
+        pytest.skip("Fortran logmart library not built")
+
+    A = matrices
+    x_f, chi2_f, i_f = airtools.logmart(A, A @ x, relax=5, max_iter=2000, backend="fortran")
+    x_n, chi2_n, i_n = airtools.logmart(A, A @ x, relax=5, max_iter=2000, backend="numpy")
+    assert x_f == approx(x_n)
+    assert i_f == i_n
+
 
 @pytest.mark.parametrize("name", used)
 def test_maxent(matrices, name):
@@ -42,6 +148,234 @@ def test_maxent(matrices, name):
     assert x_est == approx(x, rel=0.01)
 
 
+@pytest.mark.parametrize("name", used)
+def test_maxent_workers(matrices, name):
+    A = matrices
+    lamb = np.logspace(-1, -6, 4)
+
+    for iA in [A, sparse.csr_matrix(A)]:
+        serial = airtools.maxent(iA, A @ x, lamb)
+        parallel = airtools.maxent(iA, A @ x, lamb, workers=2)
+        for s, p in zip(serial, parallel):
+            assert p == approx(s)
+
+
+@pytest.mark.parametrize("name", used)
+def test_maxent_linear_operator(matrices, name):
+    A = matrices
+    L = LinearOperator(A.shape, matvec=lambda v: A @ v, rmatvec=lambda v: A.T @ v, dtype=float)
+    lamb = [1e-2, 1e-4]
+
+    ref = airtools.maxent(A, A @ x, lamb)
+    for r, e in zip(airtools.maxent(L, A @ x, lamb), ref):
+        assert r == approx(e)
+
+    with pytest.raises(ValueError):
+        airtools.maxent(L, A @ x, lamb, workers=2)
+
+    with pytest.raises(ValueError):
+        airtools.Operator(L).row_norm_sq
+
+
+def test_maxent_positive_step():
+    from airtools.maxent import _positive_step
+
+    rng = np.random.default_rng(0)
+    x = rng.random((1000, 3)) + 1e-3
+    p = rng.standard_normal((1000, 3))
+    # a column where the bound is reached by several entries at once
+    p[:, 2] = np.abs(p[:, 2])
+    p[:10, 2] = -x[:10, 2]
+    q = p / x
+
+    alpha = _positive_step(x, p, q, q.min(axis=0))
+
+    bound = np.where(p < 0, -x / np.where(p < 0, p, -1), np.inf).min(axis=0)
+    assert alpha == approx(bound, rel=1e-14)
+    assert (x + alpha * p > 0).all()
+    assert np.isfinite(np.log1p(alpha * q)).all()
+
+
+def test_maxent_entropy_term():
+    from airtools.maxent import ENTROPY_LOOP_COLUMNS, _entropy_term
+
+    rng = np.random.default_rng(0)
+    k = 2 * ENTROPY_LOOP_COLUMNS
+    q = rng.random((50, k))
+    p = rng.standard_normal((50, k))
+    alpha = rng.random(k)
+
+    for cols in [range(3), range(k), np.arange(0, k, 2)[: ENTROPY_LOOP_COLUMNS + 1]]:
+        z = np.zeros((50, k))
+        pz = _entropy_term(alpha, q, p, z, cols)
+        ref = np.log1p(alpha[cols] * q[:, cols])
+        assert z[:, cols] == approx(ref)
+        assert pz == approx((p[:, cols] * ref).sum(axis=0))
+
+
+def test_maxent_continuation():
+    rng = np.random.default_rng(0)
+    A = rng.random((30, 20))
+    b = A @ (rng.random(20) + 0.1)
+    lamb = np.logspace(-4, -1, 5)
+
+    cold = airtools.maxent(A, b, lamb, full_output=True)
+    warm = airtools.maxent(A, b, lamb, continuation=True, full_output=True)
+
+    assert warm[3]["iterations"].shape == lamb.shape
+    assert warm[3]["iterations"].sum() < cold[3]["iterations"].sum()
+    assert warm[1] == approx(cold[1], abs=1e-4)
+    assert warm[2] == approx(cold[2], rel=1e-4)
+
+    with pytest.raises(ValueError):
+        airtools.maxent(A, b, lamb, continuation=True, workers=2)
+
+
+@pytest.mark.parametrize("name", used)
+def test_maxent_history(tmp_path, matrices, name):
+    A = matrices
+    lamb = [1e-2, 1e-4]
+
+    x_ref = airtools.maxent(A, A @ x, lamb)[0]
+    x_est, _, _, info = airtools.maxent(A, A @ x, lamb, full_output=True, history=3)
+    assert x_est == approx(x_ref)
+
+    for h, it in zip(info["history"], info["iterations"]):
+        assert h["x"].shape == (x.size, -(-it // 3))
+        assert h["objective"].shape == h["step"].shape == h["gradient"].shape == (it,)
+
+    info_file = airtools.maxent(
+        A, A @ x, lamb, full_output=True, history=3, history_dir=tmp_path
+    )[3]
+    assert (tmp_path / "x_history_1.npy").is_file()
+    for h, h_file in zip(info["history"], info_file["history"]):
+        assert np.array_equal(h_file["x"], h["x"])
+
+
+@pytest.mark.parametrize("name", used)
+def test_callback(matrices, name):
+    A = matrices
+    b = A @ x
+
+    for solve in (
+        lambda **kw: airtools.kaczmarz(A, b, max_iter=20, **kw),
+        lambda **kw: airtools.logmart(A, b, relax=5, max_iter=50, backend="numpy", **kw),
+        lambda **kw: airtools.maxent(A, b, 1e-4, **kw),
+    ):
+        infos = []
+        out = solve(callback=infos.append)
+        assert out[0] == approx(solve()[0], rel=0, abs=0)
+
+        assert [i["iteration"] for i in infos] == list(range(len(infos)))
+        assert set(infos[0]["time"]) == {"projection", "backprojection", "update"}
+        assert isinstance(infos[-1]["residual"], float)
+        # unless the first iteration already solves it, as for the identity
+        assert infos[-1]["residual"] < infos[0]["residual"] or infos[0]["residual"] == 0
+        assert np.isfinite(infos[-1]["objective"])
+
+    # the residual of the returned x
+    infos = []
+    x_est = airtools.kaczmarz(A, b, max_iter=20, callback=infos.append)[0]
+    assert infos[-1]["residual"] == approx(np.linalg.norm(b - A @ x_est))
+
+    infos = []
+    airtools.maxent(A, np.column_stack((b, 2 * b)), [1e-2, 1e-4], callback=infos.append)
+    assert sorted({i["lambda"] for i in infos}) == approx([1e-4, 1e-2])
+    assert infos[0]["residual"].shape == (2,)
+
+    with pytest.raises(ValueError):
+        airtools.maxent(A, b, [1e-2, 1e-4], workers=2, callback=infos.append)
+    with pytest.raises(ValueError):
+        airtools.logmart(A, b, backend="fortran", callback=infos.append)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("order", ["cyclic", "random"])
+@pytest.mark.parametrize("block_size", [1, 2])
+def test_kaczmarz_mdp(tmp_path, block_size, order, streaming):
+    from airtools.problems import add_noise, paralleltomo, shepplogan
+
+    A = paralleltomo(16, np.arange(0, 180, 10))
+    b, e = add_noise(A @ shepplogan(16).ravel(), 0.02, seed=0)
+    if streaming:
+        # the residual is computed during the sweeps over the blocks of rows
+        airtools.RowBlockMatrix.save(tmp_path, A)
+        A = airtools.RowBlockMatrix.load(tmp_path, block_rows=100)
+    taudelta = 1.1 * np.linalg.norm(e)
+    kw = {"block_size": block_size, "order": order, "seed": 0}
+
+    infos = []
+    x_est, residual = airtools.kaczmarz(
+        A, b, max_iter=200, stop_mdp=True, taudelta=taudelta, callback=infos.append, **kw
+    )
+    assert residual == approx(b - A @ x_est)
+    assert infos[-1]["residual"] == approx(np.linalg.norm(residual))
+    assert infos[-1]["residual"] <= taudelta < infos[-2]["residual"]
+
+    # the same iterate as from the sweeps alone
+    assert x_est == approx(airtools.kaczmarz(A, b, max_iter=len(infos), **kw)[0], rel=1e-12)
+
+
+@pytest.mark.parametrize("name", used)
+def test_kaczmarz_logging(caplog, matrices, name):
+    A = matrices
+    with caplog.at_level("INFO"):
+        airtools.kaczmarz(A, A @ x, max_iter=2)
+    assert "Iteration 0" in caplog.text
+
+
+@pytest.mark.parametrize("name", used)
+def test_batched(matrices, name):
+    A = matrices
+    X = np.column_stack((x, 2 * x, x[::-1]))
+    B = A @ X
+
+    X_est = airtools.kaczmarz(A, B, max_iter=100)[0]
+    assert X_est.shape == X.shape
+    assert X_est == approx(X, rel=0.01)
+
+    X_est = airtools.logmart(A, B, relax=5, max_iter=2000)[0]
+    assert X_est.shape == X.shape
+    assert X_est == approx(X, rel=0.01)
+
+    X_est = airtools.maxent(A, B, lamb=1e-6)[0]
+    assert X_est.shape == X.shape
+    assert X_est == approx(X, rel=0.01)
+
+
+@pytest.mark.parametrize("name", used)
+def test_operator(matrices, name):
+    A = matrices
+    b = A @ x
+    for op in [airtools.Operator(A), airtools.Operator(sparse.csc_matrix(A))]:
+        assert op.row_norm_sq == approx((A**2).sum(axis=1))
+        assert op.nonnegative
+
+        assert airtools.kaczmarz(op, b, max_iter=100)[0] == approx(
+            airtools.kaczmarz(A, b, max_iter=100)[0]
+        )
+        assert airtools.logmart(op, b, relax=5, max_iter=2000)[0] == approx(
+            airtools.logmart(A, b, relax=5, max_iter=2000)[0]
+        )
+        assert airtools.maxent(op, b, lamb=1e-6)[0] == approx(x, rel=0.01)
+
+
+def test_rowblock(tmp_path):
+    A = sparse.random(50, 30, density=0.3, format="csr", random_state=1)
+    B = A @ np.column_stack((np.linspace(1, 2, 30), np.linspace(2, 1, 30)))
+
+    airtools.RowBlockMatrix.save(tmp_path, A)
+    R = airtools.RowBlockMatrix.load(tmp_path, block_rows=7)
+
+    assert R @ B[:30] == approx(A @ B[:30])
+    assert R.T @ B == approx(A.T @ B)
+
+    assert airtools.kaczmarz(R, B, max_iter=10)[0] == approx(
+        airtools.kaczmarz(A, B, max_iter=10)[0]
+    )
+    assert airtools.logmart(R, B, max_iter=50)[0] == approx(airtools.logmart(A, B, max_iter=50)[0])
+
+
 def test_rzr():
     A = np.array([[1, 2, 3], [0, 0, 0], [4, 5, 6]])
     b = np.array([1, 2, 3])
@@ -50,6 +384,87 @@ def test_rzr():
     assert br == approx(np.array([1, 3]))
 
 
+@pytest.mark.parametrize("kind", ["dense", "sparse", "operator"])
+def test_rzr_columns(kind):
+    # negative elements count as nonzero, column 3 is only seen by the removed row 1
+    A = np.array([[1, 0, -2, 0], [0, 0, 0, 5], [0, 0, 3, 0], [-1, 0, 0, 0]], dtype=float)
+    b = np.arange(4.0)
+    Ain = {"dense": A, "sparse": sparse.csr_matrix(A), "operator": airtools.Operator(A)}[kind]
+
+    Ar, br, g, cols = airtools.rzr(Ain, b, 1, 0)
+    assert g.tolist() == [True, False, False, False]
+    assert cols.tolist() == [True, False, True, False]
+    assert br == approx(b[g])
+
+    Ar, br, g, cols = airtools.rzr(Ain, b, Mthr=0)
+    assert cols.tolist() == [True, False, True, True]
+    if kind == "operator":
+        assert isinstance(Ar, airtools.Operator)
+        Ar = Ar.A
+    if sparse.issparse(Ar):
+        Ar = Ar.toarray()
+    assert Ar == approx(A[:, cols])
+
+    x = airtools.expand(np.array([1.0, 2.0, 3.0]), cols, fill=np.nan)
+    assert np.isnan(x[1]) and x[[0, 2, 3]] == approx([1, 2, 3])
+    assert airtools.expand(np.ones((3, 2)), cols).shape == (4, 2)
+
+
+def test_paralleltomo():
+    from airtools.problems import paralleltomo
+
+    N = 16
+    theta = np.array([0, 30, 45, 90, 137])
+    # ray offsets between the grid lines, so no ray runs along the edge of a pixel
+    A = paralleltomo(N, theta, p=20)
+    assert A.shape == (100, N**2)
+    assert A.has_canonical_format
+
+    # each row sums to the length of the ray inside the image
+    t = np.tile(np.linspace(-9.5, 9.5, 20), theta.size)
+    c = np.repeat(np.cos(np.radians(theta)), 20)
+    s = np.repeat(np.sin(np.radians(theta)), 20)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        enter = np.maximum(
+            np.fmin((-N / 2 + t * s) / c, (N / 2 + t * s) / c),
+            np.fmin((-N / 2 - t * c) / s, (N / 2 - t * c) / s),
+        )
+        leave = np.minimum(
+            np.fmax((-N / 2 + t * s) / c, (N / 2 + t * s) / c),
+            np.fmax((-N / 2 - t * c) / s, (N / 2 - t * c) / s),
+        )
+    assert A.sum(axis=1).A1 == approx(np.clip(leave - enter, 0, None), abs=1e-12)
+
+    # horizontal ray through the second row of pixels from the top
+    assert A[16].toarray().reshape(N, N)[1] == approx(np.ones(N))
+
+
+def test_fanbeamtomo():
+    from airtools.problems import fanbeamtomo
+
+    N = 16
+    A = fanbeamtomo(N, [0, 90, 200], p=21)
+    assert A.shape == (63, N**2)
+    assert A.has_canonical_format
+    # the central rays cross the center of the image
+    assert A.sum(axis=1).A1[[10, 31, 52]] == approx([N, N, N / np.cos(np.radians(20))])
+    assert (A.sum(axis=1).A1 <= np.sqrt(2) * N + 1e-12).all()
+
+
+def test_phantoms():
+    from airtools.problems import add_noise, shepplogan, smooth
+
+    for phantom in (shepplogan(64), smooth(64)):
+        assert phantom.shape == (64, 64)
+        assert phantom.min() >= 0
+        assert phantom.max() == approx(1)
+
+    b = np.linspace(1, 2, 100)
+    bn, e = add_noise(b, 0.05, seed=0)
+    assert np.linalg.norm(e) == approx(0.05 * np.linalg.norm(b))
+    assert bn == approx(b + e)
+
+
 def test_picard():
     U, s, V = svd(np.array([[3, 2, 2], [2, 3, -2], [2, 3, 4]]))
     eta = airtools.picard(U, s, V)[0]
@@ -57,6 +472,32 @@ def test_picard():
     assert eta == approx([0.02132175, 0.00238076, 0.04433971], rel=1e-4)
 
 
+def test_picard_smoothing():
+    n = 1000
+    # a geometric mean over 41 coefficients of 1e-20 underflows as a product
+    eta, _, _, _, keta, _ = airtools.picard(np.eye(n), np.ones(n), np.full(n, 1e-20), d=20)
+
+    assert keta == approx(np.arange(20, n - 20))
+    assert eta[keta] == approx(1e-20)
+
+
+@pytest.mark.parametrize("method", ["svds", "randomized"])
+def test_csvd(method):
+    rng = np.random.default_rng(0)
+    # decaying spectrum, like a discretized ill-posed problem
+    A = rng.random((60, 40)) @ np.diag(np.logspace(0, -8, 40)) @ rng.random((40, 40))
+
+    U, s, V = airtools.csvd(A)
+    assert U.shape == (60, 40) and s.shape == (40,) and V.shape == (40, 40)
+    assert U @ np.diag(s) @ V.T == approx(A)
+
+    for iA in [A, sparse.csr_matrix(A)]:
+        Uk, sk, Vk = airtools.csvd(iA, 5, method=method, seed=0)
+        assert sk == approx(s[:5])
+        assert np.abs(Uk.T @ U[:, :5]).diagonal() == approx(1)
+        assert airtools.picard(Uk, sk, A @ x[:1].repeat(40))[0].shape == (5,)
+
+
 def test_lsqlin():
     pytest.importorskip("cvxopt")
     import airtools.lsqlin as lsqlin
@@ -117,4 +558,164 @@ def test_lsqlin():
     C = np.array([[0.0372, 0.2869], [0.6861, 0.7071], [0.6233, 0.6245], [0.6344, 0.6170]])
     d = np.array([0.8587, 0.1781, 0.0747, 0.8405])
     ret = lsqlin.lsqnonneg(C, d, {"show_progress": False})
-    assert ret["x"] == approx([2.5e-7, 6.93e-1], rel=1e-2)
+    assert ret["x"] == approx([0, 6.93e-1], rel=1e-2, abs=1e-6)
+
+
+def test_lsqlin_bounds():
+    pytest.importorskip("cvxopt")
+    import airtools.lsqlin as lsqlin
+
+    rng = np.random.default_rng(0)
+    C = rng.random((30, 20))
+    d = rng.random(30)
+    opts = {"show_progress": False}
+
+    for iC in [
+        C,
+        sparse.csr_matrix(C),
+        lsqlin.scipy_sparse_to_spmatrix(sparse.coo_matrix(C)),
+        airtools.Operator(C),
+        airtools.Operator(sparse.csr_matrix(C)),
+    ]:
+        for reg in [0, 0.1]:
+            qp = lsqlin.lsqlin(iC, d, reg, lb=0, ub=0.5, opts=opts, solver="cvxopt")
+            ret = lsqlin.lsqlin(iC, d, reg, lb=0, ub=0.5, opts=opts)
+            assert ret["status"] == "optimal"
+            assert ret["x"] == approx(np.array(qp["x"]).ravel(), abs=1e-3)
+            assert ((0 <= ret["x"]) & (ret["x"] <= 0.5)).all()
+
+    # CVXOPT options are not the iteration limit of lsq_linear
+    ret = lsqlin.lsqlin(C, d, lb=0, ub=0.1, opts={"show_progress": False, "maxiters": 1})
+    assert ret["status"] == "optimal"
+    assert lsqlin.lsqlin(C, d, lb=0, ub=0.1, max_iter=1)["status"] == "unknown"
+
+    with pytest.raises(ValueError):
+        lsqlin.lsqlin(C, d, A=C[:2], b=d[:2], lb=0, solver="lsq_linear")
+    L = LinearOperator(C.shape, matvec=lambda v: C @ v, rmatvec=lambda v: C.T @ v, dtype=float)
+    with pytest.raises(ValueError):
+        lsqlin.lsqlin(airtools.Operator(L), d, lb=0)
+
+
+def test_lsqlin_conversion():
+    cvxopt = pytest.importorskip("cvxopt")
+    import airtools.lsqlin as lsqlin
+
+    # duplicate entries, and empty last row and column that triplets alone would lose
+    A = sparse.coo_matrix(([1.0, 2.0, 3.0, 4], ([0, 2, 0, 1], [1, 0, 1, 2])), shape=(4, 5))
+
+    S = lsqlin.scipy_sparse_to_spmatrix(A)
+    assert S.size == A.shape
+    assert np.array(cvxopt.matrix(S)) == approx(A.toarray())
+
+    B = lsqlin.spmatrix_sparse_to_scipy(S)
+    assert B.shape == A.shape
+    assert B.toarray() == approx(A.toarray())
+
+    S = lsqlin.scipy_sparse_to_spmatrix(sparse.csr_matrix((3, 2)))
+    assert lsqlin.spmatrix_sparse_to_scipy(S).nnz == 0
+
+
+def test_lsqnonneg():
+    import airtools.lsqlin as lsqlin
+
+    C = np.array([[0.0372, 0.2869], [0.6861, 0.7071], [0.6233, 0.6245], [0.6344, 0.6170]])
+    d = np.array([0.8587, 0.1781, 0.0747, 0.8405])
+    for solver in ["auto", "nnls", "projected_gradient"]:
+        ret = lsqlin.lsqnonneg(C, d, solver=solver)
+        assert ret["status"] == "optimal"
+        assert ret["x"] == approx([0, 6.93e-1], rel=1e-2, abs=1e-6)
+
+    rng = np.random.default_rng(0)
+    C = sparse.random(300, 100, density=0.05, random_state=0, format="csr")
+    d = C @ np.maximum(rng.standard_normal(100), 0) + 0.01 * rng.standard_normal(300)
+
+    ref = lsqlin.lsqnonneg(C, d, solver="nnls")["x"]
+    ret = lsqlin.lsqnonneg(C, d)
+    assert ret["message"] == "projected gradient"
+    assert ret["x"] == approx(ref, abs=1e-5)
+    assert lsqlin.lsqnonneg(airtools.Operator(C), d)["x"] == approx(ref, abs=1e-5)
+
+    # CVXOPT options are not iteration limits of the other solvers
+    D = C.toarray()
+    ret = lsqlin.lsqnonneg(D, d, {"show_progress": False, "maxiters": 10})
+    assert ret["status"] == "optimal"
+    assert ret["x"] == approx(ref)
+
+    # the active set falls back to projected gradient at its iteration limit
+    ret = lsqlin.lsqnonneg(D, d, solver="nnls", max_iter=2)
+    assert ret["message"] == "projected gradient"
+    assert lsqlin.lsqnonneg(D, d, solver="projected_gradient", max_iter=0)["iterations"] == 0
+
+
+def test_lsqlin_without_cvxopt(monkeypatch):
+    import importlib.util
+    import sys
+
+    # a fresh copy of the module, imported as if cvxopt was not installed
+    monkeypatch.setitem(sys.modules, "cvxopt", None)
+    spec = importlib.util.find_spec("airtools.lsqlin")
+    lsqlin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(lsqlin)
+
+    C = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    d = np.array([1.0, -1.0, 0.5])
+    assert lsqlin.lsqnonneg(C, d)["x"] == approx([0.75, 0], abs=1e-8)
+    assert lsqlin.lsqlin(C, d, lb=0)["x"] == approx([0.75, 0], abs=1e-8)
+
+    with pytest.raises(ImportError):
+        lsqlin.lsqlin(C, d, A=C[:1], b=d[:1])
+
+
+def test_lsqlin_problem():
+    pytest.importorskip("cvxopt")
+    import airtools.lsqlin as lsqlin
+
+    rng = np.random.default_rng(0)
+    C = rng.random((60, 30))
+    A = rng.random((5, 30))
+    b = np.full(5, 3.0)
+    Aeq = np.ones((1, 30))
+    beq = np.array([4.0])
+    opts = {"show_progress": False}
+
+    P = lsqlin.LsqlinProblem(C, 0.01, A, b, Aeq, beq, lb=0, opts=opts)
+    x = rng.random(30)
+    iterations = []
+    for k in range(4):
+        d = C @ (x + 0.01 * k)
+        sol = P.solve(d)
+        ref = lsqlin.lsqlin(C, d, 0.01, A, b, Aeq, beq, lb=0, opts=opts)
+        assert sol["status"] == "optimal"
+        assert np.array(sol["x"]) == approx(np.array(ref["x"]), abs=1e-4)
+        iterations.append(sol["iterations"])
+
+    assert max(iterations[1:]) < iterations[0]
+
+    P = lsqlin.LsqlinProblem(C, lb=0, ub=1)
+    assert P.solve(d)["x"] == approx(lsqlin.lsqlin(C, d, lb=0, ub=1)["x"])
+
+
+def test_lsqlin_threads():
+    cvxopt = pytest.importorskip("cvxopt")
+    from concurrent.futures import ThreadPoolExecutor
+    import airtools.lsqlin as lsqlin
+
+    rng = np.random.default_rng(0)
+    C = rng.random((40, 20))
+    A = rng.random((4, 20))
+    b = np.full(4, 2.0)
+    D = [C @ rng.random(20) for _ in range(32)]
+    # tolerances differ per call, and must not leak into other calls or the global options
+    opts = [{"show_progress": False, "reltol": 10.0 ** -(6 + i % 3)} for i in range(len(D))]
+
+    def solve(i):
+        return np.array(lsqlin.lsqlin(C, D[i], 0, A, b, lb=0, opts=opts[i], solver="cvxopt")["x"])
+
+    global_options = dict(cvxopt.solvers.options)
+    serial = [solve(i) for i in range(len(D))]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        parallel = list(pool.map(solve, range(len(D))))
+
+    assert cvxopt.solvers.options == global_options
+    for s, p in zip(serial, parallel):
+        assert p == approx(s)